@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the request pipeline and the SQLAlchemy manager.
+
+Runs the ``Bank`` resource of ``app.py`` on SQLite databases seeded with
+each of the given sizes and prints one JSON document with the results::
+
+    python benchmarks/bench.py --sizes 1000,100000,1000000 --output results.json
+
+Seeded databases are kept in ``--db-dir`` and reused by later runs; the
+``create`` and ``update`` routes write to a throwaway copy, so the seeded
+data stays as it was. Route timings go through the Flask test client; ``format_response``,
+``_make_response`` and resource class creation are also timed on their own.
+
+Startup is timed on a separate application with ``--startup-resources``
+generated models: defining the resource classes, registering them, warming
+them up and serving the first request.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED_CHUNK_SIZE = 10000
+
+
+def _seed(db, model, size):
+    table = model.__table__
+    db.drop_all()
+    db.create_all()
+
+    for start in range(0, size, SEED_CHUNK_SIZE):
+        rows = [{'name': u'Bank {:07d}'.format(i), 'bcra_code': u'{:05d}'.format(i % 100000)}
+                for i in range(start, min(start + SEED_CHUNK_SIZE, size))]
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def _prepare(app, db, model, size, db_dir):
+    path = os.path.join(db_dir, 'tonic-bench-{}.db'.format(size))
+
+    # the engine is created on first use, after the URI is set
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['DEBUG'] = False
+
+    with app.app_context():
+        db.session.remove()
+        if not os.path.exists(path) or model.query.count() != size:
+            _seed(db, model, size)
+        db.session.remove()
+        db.engine.dispose()
+    return path
+
+
+def _use_database(app, db, path):
+    # a new URI makes Flask-SQLAlchemy create a new engine on next use
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+
+
+@contextlib.contextmanager
+def _scratch_copy(app, db, path):
+    """Points the application at a copy of the database at `path`"""
+    fd, copy = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(path))
+    os.close(fd)
+    shutil.copyfile(path, copy)
+    _use_database(app, db, copy)
+    try:
+        yield copy
+    finally:
+        _use_database(app, db, path)
+        os.remove(copy)
+
+
+def _measure(func, number, warmup):
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(number):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'number': number,
+        'total_s': total,
+        'ops_per_s': number / total if total else None,
+        'mean_ms': total / number * 1000,
+        'median_ms': timings[number // 2] * 1000,
+        'p95_ms': timings[min(number - 1, int(number * 0.95))] * 1000,
+    }
+
+
+def _checked(response, status):
+    if response.status_code != status:
+        raise RuntimeError('{} {}: {}'.format(response.status_code, response.status,
+                                              response.get_data(as_text=True)[:200]))
+    return response
+
+
+def bench_routes(app, db, path, size, number, warmup):
+    client = app.test_client()
+    rng = random.Random(size)
+    counter = iter(range(10 ** 9))
+
+    def instances():
+        _checked(client.get('/api/bank?per_page=20'), 200).get_data()
+
+    def instances_offset():
+        page = rng.randint(1, max(1, size // 20))
+        _checked(client.get('/api/bank?per_page=20&page={}'.format(page)), 200).get_data()
+
+    def read():
+        _checked(client.get('/api/bank/{}'.format(rng.randint(1, size))), 200).get_data()
+
+    def create():
+        name = u'Bench {}-{}'.format(os.getpid(), next(counter))
+        _checked(client.post('/api/bank', data=json.dumps({'name': name, 'bcra_code': u'1'}),
+                             content_type='application/json'), 200)
+
+    def update():
+        _checked(client.patch('/api/bank/{}'.format(rng.randint(1, size)),
+                              data=json.dumps({'cuit': str(next(counter))}),
+                              content_type='application/json'), 200)
+
+    results = {name: _measure(func, number, warmup) for name, func in (
+        ('instances', instances),
+        ('instances_offset', instances_offset),
+        ('read', read),
+    )}
+
+    with _scratch_copy(app, db, path):
+        results.update((name, _measure(func, number, warmup)) for name, func in (
+            ('create', create),
+            ('update', update),
+        ))
+    return results
+
+
+def bench_internals(app, resource, number, warmup):
+    from tonic import _make_response
+    from tonic.resource import ModelResource
+
+    manager = resource.manager
+    results = {}
+
+    with app.test_request_context('/api/bank'):
+        items = manager.paginated_instances(per_page=100).items
+        data = manager.format_response(items)
+
+        results['format_response_100'] = _measure(
+            lambda: manager.format_response(items), number, warmup)
+        results['make_response_100'] = _measure(
+            lambda: _make_response(data, 200), number, warmup)
+
+    model = manager.model
+    results['resource_class_creation'] = _measure(
+        lambda: type('BenchResource', (ModelResource,), {
+            'Meta': type('Meta', (object,), {'model': model, 'name': 'bench'}),
+        }), number, warmup)
+
+    return results
+
+
+def _startup_models(db, count, run):
+    models = []
+    for i in range(count):
+        columns = {
+            '__tablename__': 'startup_{}_{}'.format(run, i),
+            'id': db.Column(db.Integer, primary_key=True),
+            'name': db.Column(db.Unicode(40), nullable=False),
+            'code': db.Column(db.Unicode(8)),
+            'amount': db.Column(db.Numeric(10, 2)),
+            'active': db.Column(db.Boolean, default=True),
+            'created': db.Column(db.DateTime),
+        }
+        if models:
+            parent = models[-1]
+            columns['parent_id'] = db.Column(db.Integer,
+                                             db.ForeignKey(parent.__table__.c.id))
+            columns['parent'] = db.relationship(parent)
+        models.append(type('Startup{}x{}'.format(run, i), (db.Model,), columns))
+    return models
+
+
+def bench_startup(count, runs=3):
+    from flask import Flask
+    from flask_sqlalchemy import SQLAlchemy
+    from tonic import Api
+    from tonic.resource import ModelResource
+
+    timings = {}
+
+    def timed(name, func):
+        start = time.perf_counter()
+        result = func()
+        timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+    for run in range(runs):
+        app = Flask('startup{}'.format(run))
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db = SQLAlchemy(app)
+        models = _startup_models(db, count, run)
+        api = Api(app, prefix='/api')
+
+        resources = timed('define_resources_ms', lambda: [
+            type('Startup{}x{}Resource'.format(run, i), (ModelResource,), {
+                'Meta': type('Meta', (object,), {'model': model}),
+            }) for i, model in enumerate(models)])
+
+        timed('register_ms', lambda: [api.register_resource(r) for r in resources])
+        if hasattr(api, 'warmup'):
+            timed('warmup_ms', api.warmup)
+
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        timed('first_request_ms', lambda: _checked(
+            client.get('/api/{}?per_page=1'.format(resources[-1].meta.name)), 200))
+
+    result = {name: min(values) for name, values in timings.items()}
+    result['resources'] = count
+    return result
+
+
+def _revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--sizes', default='1000,100000,1000000',
+                        help='comma separated row counts (default: %(default)s)')
+    parser.add_argument('--number', type=int, default=200,
+                        help='timed calls per benchmark (default: %(default)s)')
+    parser.add_argument('--warmup', type=int, default=20,
+                        help='untimed calls before each benchmark (default: %(default)s)')
+    parser.add_argument('--db-dir', default=tempfile.gettempdir(),
+                        help='where seeded databases are kept (default: %(default)s)')
+    parser.add_argument('--startup-resources', type=int, default=300,
+                        help='resources of the startup benchmark, 0 to skip (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    # app.py is the sample application, it registers the Bank resource
+    import app as sample
+
+    results = {
+        'revision': _revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'number': args.number,
+        'sizes': {},
+    }
+
+    for size in sizes:
+        path = _prepare(sample.app, sample.db, sample.Bank, size, args.db_dir)
+
+        # keep anything printed by views out of the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            results['sizes'][str(size)] = {
+                'routes': bench_routes(sample.app, sample.db, path, size,
+                                       args.number, args.warmup),
+                'internals': bench_internals(sample.app, sample.BankResource,
+                                             args.number, args.warmup),
+            }
+
+    if args.startup_resources:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results['startup'] = bench_startup(args.startup_resources)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
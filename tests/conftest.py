@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import os
+import sys
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tonic import Api, ModelResource
+
+db = SQLAlchemy()
+
+bank_tags = db.Table(
+    'bank_tag',
+    db.Column('bank_id', db.Integer, db.ForeignKey('bank.id')),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id')))
+
+_revisions = itertools.count(1)
+
+
+class Bank(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(40), unique=True, nullable=False)
+    cuit = db.Column(db.String(11))
+    branches = db.relationship('Branch', backref='bank')
+    tags = db.relationship('Tag', secondary=bank_tags)
+
+
+class Branch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(40), nullable=False)
+    bank_id = db.Column(db.Integer, db.ForeignKey('bank.id'))
+
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(40), nullable=False)
+    # changes on every UPDATE of the row
+    revision = db.Column(db.Integer, default=0, onupdate=lambda: next(_revisions))
+
+
+class Document(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(40), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+
+    __mapper_args__ = {'version_id_col': version}
+
+
+class Event(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    at = db.Column(db.DateTime, nullable=False)
+    score = db.Column(db.Integer)
+
+
+def model_resource(model, **meta):
+    """Returns a new resource class for ``model`` with ``meta`` options"""
+    meta.setdefault('model', model)
+    meta.setdefault('name', model.__tablename__)
+    return type(model.__name__ + 'Resource', (ModelResource,),
+                {'Meta': type('Meta', (object,), meta)})
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def api(app):
+    return Api(app, prefix='/api')
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def banks(app):
+    """Three banks with two branches each"""
+    items = []
+    for i in range(3):
+        bank = Bank(name='bank %d' % i)
+        bank.branches = [Branch(name='branch %d.%d' % (i, j)) for j in range(2)]
+        items.append(bank)
+
+    db.session.add_all(items)
+    db.session.commit()
+    return items
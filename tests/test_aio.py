@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from flask import Flask
+
+pytest.importorskip('sqlalchemy.ext.asyncio')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('asgiref')
+
+from tonic import Api
+from tonic.aio import AsyncModelResource
+
+from conftest import db, Bank, Branch, Tag
+
+
+def async_resource(model, **meta):
+    meta.setdefault('model', model)
+    meta.setdefault('name', model.__tablename__)
+    return type(model.__name__ + 'AsyncResource', (AsyncModelResource,),
+                {'Meta': type('Meta', (object,), meta)})
+
+
+@pytest.fixture
+def app(tmp_path):
+    # the async engine needs the tables the sync one creates, in a file
+    path = tmp_path / 'tonic.db'
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///{}'.format(path)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TONIC_ASYNC_DATABASE_URI'] = 'sqlite+aiosqlite:///{}'.format(path)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def api(app):
+    api = Api(app, prefix='/api')
+    for model in (Bank, Branch, Tag):
+        api.register_resource(async_resource(model))
+    return api
+
+
+def test_create_and_read(client, api):
+    resp = client.post('/api/bank', json={'name': 'b1'})
+    assert resp.status_code == 200
+    assert resp.get_json() == {'id': 1, 'name': 'b1', 'cuit': None,
+                               'branches': [], 'tags': []}
+
+    assert client.get('/api/bank/1').get_json()['name'] == 'b1'
+    assert client.get('/api/bank/2').status_code == 404
+
+
+def test_create_with_related_items(client, api):
+    client.post('/api/bank', json={'name': 'b1'})
+    client.post('/api/tag', json={'name': 't1'})
+
+    resp = client.post('/api/branch', json={'name': 'new', 'bank': 1})
+    assert resp.status_code == 200
+    assert resp.get_json()['bank'] == 1
+
+    resp = client.post('/api/bank', json={'name': 'b2', 'branches': [1], 'tags': [1]})
+    assert resp.status_code == 200
+    assert (resp.get_json()['branches'], resp.get_json()['tags']) == ([1], [1])
+
+    resp = client.post('/api/branch', json={'name': 'other', 'bank': 99})
+    assert resp.status_code == 400
+
+
+def test_update_and_delete(client, api):
+    client.post('/api/bank', json={'name': 'b1'})
+    client.post('/api/bank', json={'name': 'b2'})
+    client.post('/api/branch', json={'name': 'new', 'bank': 1})
+
+    resp = client.patch('/api/branch/1', json={'bank': 2})
+    assert resp.status_code == 200
+    assert resp.get_json()['bank'] == 2
+    assert client.get('/api/bank/2').get_json()['branches'] == [1]
+
+    assert client.patch('/api/bank/1', json={'cuit': '5'}).get_json()['cuit'] == '5'
+    assert client.delete('/api/bank/1').status_code == 204
+    assert client.get('/api/bank/1').status_code == 404
+
+
+def test_conflict(client, api):
+    client.post('/api/bank', json={'name': 'b1'})
+    assert client.post('/api/bank', json={'name': 'b1'}).status_code == 409
+
+
+def test_bulk_create_with_related_items(client, api):
+    client.post('/api/bank', json={'name': 'b1'})
+
+    resp = client.post('/api/branch', json=[{'name': 'a', 'bank': 1}, {'name': 'b'}])
+    assert resp.status_code == 201
+    assert [item['bank'] for item in client.get('/api/branch').get_json()] == [1, None]
+
+
+def test_instances_pages(client, api):
+    client.post('/api/bank', json=[{'name': 'b%d' % i} for i in range(5)])
+
+    resp = client.get('/api/bank?per_page=2')
+    assert [item['id'] for item in resp.get_json()] == [1, 2]
+    assert 'rel="next"' in resp.headers['Link']
+    assert client.get('/api/bank?page=3&per_page=2').get_json()[0]['id'] == 5
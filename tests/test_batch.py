@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from flask import jsonify, request
+
+from conftest import db, Bank, model_resource
+
+
+@pytest.fixture
+def bank_api(api, banks):
+    api.register_resource(model_resource(Bank))
+    return api
+
+
+def names(client):
+    return [item['name'] for item in client.get('/api/bank?sort=id').get_json()]
+
+
+def test_batch_runs_every_entry(client, bank_api):
+    resp = client.post('/api/_batch', json=[
+        {'path': '/api/bank/1'},
+        {'method': 'PATCH', 'path': '/api/bank/2', 'body': {'cuit': '5'}},
+        {'method': 'DELETE', 'path': '/api/bank/9'},
+    ])
+
+    assert resp.status_code == 200
+    assert [entry['status'] for entry in resp.get_json()] == [200, 200, 404]
+    assert resp.get_json()[0]['body']['name'] == 'bank 0'
+
+
+def test_atomic_batch_commits_together(client, bank_api):
+    resp = client.post('/api/_batch?atomic=true', json=[
+        {'method': 'POST', 'path': '/api/bank', 'body': {'name': 'new'}},
+        {'method': 'PATCH', 'path': '/api/bank/1', 'body': {'name': 'renamed'}},
+    ])
+
+    assert [entry['status'] for entry in resp.get_json()] == [200, 200]
+    assert names(client) == ['renamed', 'bank 1', 'bank 2', 'new']
+
+
+def test_atomic_batch_rolls_back_on_error(client, bank_api):
+    resp = client.post('/api/_batch?atomic=true', json=[
+        {'method': 'POST', 'path': '/api/bank', 'body': {'name': 'new'}},
+        {'method': 'PATCH', 'path': '/api/bank/1', 'body': {'name': 'renamed'}},
+        {'method': 'DELETE', 'path': '/api/bank/99'},
+        {'method': 'DELETE', 'path': '/api/bank/2'},
+    ])
+
+    # the batch stops at the first error
+    assert [entry['status'] for entry in resp.get_json()] == [200, 200, 404]
+
+    db.session.remove()
+    assert names(client) == ['bank 0', 'bank 1', 'bank 2']
+
+
+def test_atomic_batch_rolls_back_on_conflict(client, bank_api):
+    resp = client.post('/api/_batch?atomic=true', json=[
+        {'method': 'PATCH', 'path': '/api/bank/1', 'body': {'name': 'renamed'}},
+        {'method': 'POST', 'path': '/api/bank', 'body': {'name': 'bank 2'}},
+    ])
+
+    assert resp.get_json()[-1]['status'] == 409
+
+    db.session.remove()
+    assert names(client) == ['bank 0', 'bank 1', 'bank 2']
+
+
+def test_batch_runs_before_request_hooks(app, client, bank_api):
+    @app.before_request
+    def guard():
+        if request.path.startswith('/api/bank'):
+            return jsonify(message='Forbidden'), 403
+
+    assert client.get('/api/bank/1').status_code == 403
+
+    resp = client.post('/api/_batch?atomic=true', json=[
+        {'path': '/api/bank/1'},
+        {'method': 'DELETE', 'path': '/api/bank/2'},
+    ])
+    assert [entry['status'] for entry in resp.get_json()] == [403]
+
+    resp = client.post('/api/_batch', json=[
+        {'path': '/api/bank/1'},
+        {'method': 'DELETE', 'path': '/api/bank/2'},
+    ])
+    assert [entry['status'] for entry in resp.get_json()] == [403, 403]
+
+    db.session.remove()
+    assert len(Bank.query.all()) == 3
+
+
+def test_rolled_back_batch_leaves_no_cached_count(client, bank_api):
+    resp = client.post('/api/_batch?atomic=true', json=[
+        {'method': 'POST', 'path': '/api/bank', 'body': {'name': 'new'}},
+        {'path': '/api/bank'},
+        {'method': 'DELETE', 'path': '/api/bank/99'},
+    ])
+    assert resp.get_json()[1]['headers']['X-Total-Count'] == '4'
+
+    db.session.remove()
+    resp = client.get('/api/bank')
+    assert resp.headers['X-Total-Count'] == '3'
+    assert len(resp.get_json()) == 3
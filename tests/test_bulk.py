@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import db, Bank, model_resource
+
+
+@pytest.fixture
+def bank_api(api, banks):
+    api.register_resource(model_resource(Bank))
+    return api
+
+
+def cuits(client):
+    return [item['cuit'] for item in client.get('/api/bank?sort=id').get_json()]
+
+
+def test_update_where(client, bank_api):
+    resp = client.patch('/api/bank?where={"id":{"$gt":1}}', json={'cuit': '5'})
+
+    assert resp.status_code == 200
+    assert resp.get_json() == {'affected': 2}
+    assert cuits(client) == [None, '5', '5']
+
+
+def test_update_ids(client, bank_api):
+    resp = client.patch('/api/bank?ids=1,3,9', json={'cuit': '7'})
+
+    assert resp.get_json() == {'affected': 2}
+    assert cuits(client) == ['7', None, '7']
+
+
+def test_update_where_and_ids(client, bank_api):
+    resp = client.patch('/api/bank?ids=1,2&where={"name":"bank 1"}', json={'cuit': '7'})
+
+    assert resp.get_json() == {'affected': 1}
+    assert cuits(client) == [None, '7', None]
+
+
+@pytest.mark.parametrize('body', [{}, {'branches': [1]}])
+def test_update_rejects_changes(client, bank_api, body):
+    resp = client.patch('/api/bank?ids=1', json=body)
+
+    assert resp.status_code == 400
+    assert cuits(client) == [None, None, None]
+
+
+def test_update_conflict(client, bank_api):
+    resp = client.patch('/api/bank?ids=1,2', json={'name': 'same'})
+
+    assert resp.status_code == 409
+    db.session.remove()
+    assert [bank.name for bank in Bank.query.order_by(Bank.id)] == ['bank 0', 'bank 1', 'bank 2']
+
+
+def test_delete_where(client, bank_api):
+    resp = client.delete('/api/bank?where={"name":{"$in":["bank 0","bank 2"]}}')
+
+    assert resp.status_code == 200
+    assert resp.get_json() == {'affected': 2}
+    resp = client.get('/api/bank')
+    assert [item['id'] for item in resp.get_json()] == [2]
+    assert resp.headers['X-Total-Count'] == '1'
+
+
+def test_delete_ids(client, bank_api):
+    assert client.get('/api/bank').headers['X-Total-Count'] == '3'
+    assert client.delete('/api/bank?ids=2').get_json() == {'affected': 1}
+    assert client.get('/api/bank').headers['X-Total-Count'] == '2'
+    assert client.get('/api/bank/2').status_code == 404
+
+
+@pytest.mark.parametrize('method', ['PATCH', 'DELETE'])
+def test_filter_is_required(client, bank_api, method):
+    resp = client.open('/api/bank', method=method, json={'cuit': '1'})
+
+    assert resp.status_code == 400
+    assert resp.get_json()['message'] == 'A where filter or a list of ids is required'
+    assert len(Bank.query.all()) == 3
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from functools import wraps
+
+import pytest
+from flask import request
+
+from conftest import Bank, Branch, model_resource
+
+
+def require_token(calls):
+    """A route decorator answering 401 without ``Authorization: token``"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            calls.append(request.headers.get('Authorization'))
+            if request.headers.get('Authorization') != 'token':
+                return {'message': 'Unauthorized'}, 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def cached(api, banks, calls):
+    api.register_resource(model_resource(Bank, cache=True, identity_cache=True,
+                                         route_decorators={'self': require_token(calls)}))
+    api.register_resource(model_resource(Branch, cache=True))
+
+
+def test_cache_hits_run_route_decorators(client, cached, calls):
+    assert client.get('/api/bank/1', headers={'Authorization': 'token'}).status_code == 200
+    assert client.get('/api/bank/1').status_code == 401
+    assert client.get('/api/bank/1', headers={'Authorization': 'other'}).status_code == 401
+    assert calls == ['token', None, 'other']
+
+
+def test_cache_key_varies_on_credentials(api, client, cached):
+    headers = {'Authorization': 'token'}
+    client.get('/api/bank/1', headers=headers)
+    misses = api.cache.misses
+
+    client.get('/api/bank/1', headers=headers)
+    assert api.cache.misses == misses
+
+    client.set_cookie('localhost', 'session', '1')
+    client.get('/api/bank/1', headers=headers)
+    assert api.cache.misses == misses + 1
+
+
+def test_write_invalidates_own_resource(client, cached):
+    assert client.get('/api/branch/1').get_json()['name'] == 'branch 0.0'
+    client.patch('/api/branch/1', json={'name': 'renamed'})
+    assert client.get('/api/branch/1').get_json()['name'] == 'renamed'
+
+
+def test_write_invalidates_related_resources(client, cached):
+    headers = {'Authorization': 'token'}
+    assert client.get('/api/bank/1', headers=headers).get_json()['branches'] == [1, 2]
+
+    resp = client.post('/api/branch', json={'name': 'new', 'bank': 1})
+    assert resp.status_code in (200, 201)
+
+    branches = client.get('/api/bank/1', headers=headers).get_json()['branches']
+    assert branches == [1, 2, resp.get_json()['id']]
+
+
+def test_write_invalidates_embedding_resources(client, cached):
+    headers = {'Authorization': 'token'}
+    url = '/api/bank/1?embed=branches'
+    assert client.get(url, headers=headers).get_json()['branches'][0]['name'] == 'branch 0.0'
+
+    client.patch('/api/branch/1', json={'name': 'renamed'})
+    assert client.get(url, headers=headers).get_json()['branches'][0]['name'] == 'renamed'
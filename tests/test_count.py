@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import event
+
+from conftest import db, Bank, model_resource
+
+
+@pytest.fixture
+def statements(app):
+    """Collects the SQL statements run on the engine"""
+    collected = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        collected.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    yield collected
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def counts(statements):
+    return len([statement for statement in statements if 'count(' in statement.lower()])
+
+
+def test_total_count(client, api, banks):
+    api.register_resource(model_resource(Bank))
+
+    assert client.get('/api/bank?per_page=1').headers['X-Total-Count'] == '3'
+    assert client.get('/api/bank?where={"id":{"$gt":1}}').headers['X-Total-Count'] == '2'
+    assert 'X-Total-Count' not in client.get('/api/bank?count=false').headers
+
+
+def test_head_counts_without_rows(client, api, banks, statements):
+    api.register_resource(model_resource(Bank, count_cache=False))
+
+    resp = client.head('/api/bank?where={"name":{"$startswith":"bank"}}')
+
+    assert resp.status_code == 200
+    assert resp.headers['X-Total-Count'] == '3'
+    assert resp.get_data() == b''
+    assert len(statements) == counts(statements) == 1
+
+    assert 'X-Total-Count' not in client.head('/api/bank?count=false').headers
+    assert len(statements) == 1
+
+
+def test_counts_are_cached_until_a_write(client, api, banks, statements):
+    api.register_resource(model_resource(Bank))
+
+    client.get('/api/bank')
+    client.head('/api/bank')
+    assert counts(statements) == 1
+
+    client.get('/api/bank?where={"id":1}')
+    assert counts(statements) == 2
+
+    client.post('/api/bank', json={'name': 'new'})
+    assert client.head('/api/bank').headers['X-Total-Count'] == '4'
+    assert counts(statements) == 3
+
+
+def test_count_cache_can_be_disabled(client, api, banks, statements):
+    api.register_resource(model_resource(Bank, count_cache=False))
+
+    client.get('/api/bank')
+    client.get('/api/bank')
+    assert counts(statements) == 2
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import decimal
+import json
+import uuid
+
+import pytest
+
+from tonic.encoders import ENCODERS, get_encoder
+
+from conftest import Bank, model_resource
+
+DATA = {
+    'at': datetime.datetime(2020, 1, 2, 3, 4, 5),
+    'day': datetime.date(2020, 1, 2),
+    'amount': decimal.Decimal('10.25'),
+    'key': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'name': u'Nación / 1',
+}
+
+
+@pytest.fixture(params=sorted(ENCODERS))
+def name(request):
+    if request.param != 'json':
+        pytest.importorskip(request.param)
+    return request.param
+
+
+@pytest.fixture
+def dumps(name):
+    return get_encoder(name)
+
+
+def test_encoders_agree(app, name, dumps):
+    data = json.loads(dumps(DATA).decode('utf-8'))
+
+    # ujson encodes Decimal itself, as a number
+    assert data.pop('amount') == (10.25 if name == 'ujson' else '10.25')
+    assert data == {
+        'at': '2020-01-02T03:04:05',
+        'day': '2020-01-02',
+        'key': '12345678-1234-5678-1234-567812345678',
+        'name': u'Nación / 1',
+    }
+
+
+def test_bytes(app, dumps):
+    assert isinstance(dumps([]), bytes)
+
+
+def test_pretty(app, dumps):
+    data = dumps({'b': 1, 'a': [1]}, pretty=True).decode('utf-8')
+
+    assert data.index('"a"') < data.index('"b"')
+    assert '\n' in data
+    assert json.loads(data) == {'a': [1], 'b': 1}
+
+
+def test_unknown_types(app, dumps):
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_auto_encoder_is_reused():
+    assert get_encoder('auto') is get_encoder('auto')
+
+
+@pytest.mark.parametrize('encoder', ['auto', 'json'])
+def test_responses(app, client, api, banks, encoder):
+    app.config['TONIC_JSON_ENCODER'] = encoder
+    api.register_resource(model_resource(Bank))
+
+    resp = client.get('/api/bank/1')
+    assert resp.mimetype == 'application/json'
+    assert b'\n' not in resp.get_data().strip()
+
+    pretty = client.get('/api/bank/1?pretty=1')
+    assert b'\n' in pretty.get_data().strip()
+    assert pretty.get_json() == resp.get_json()
+
+    assert b'\n' not in client.get('/api/bank/1?pretty=false').get_data().strip()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import db, Bank, Document, model_resource
+
+
+@pytest.fixture
+def documents(api):
+    api.register_resource(model_resource(Document))
+    db.session.add_all([Document(title='first'), Document(title='second')])
+    db.session.commit()
+
+
+@pytest.fixture
+def bank_api(api, banks):
+    api.register_resource(model_resource(Bank))
+
+
+def test_conditional_get(client, bank_api):
+    resp = client.get('/api/bank/1')
+    etag = resp.headers['ETag']
+
+    assert client.get('/api/bank/1', headers={'If-None-Match': etag}).status_code == 304
+
+    client.patch('/api/bank/1', json={'cuit': '5'})
+    assert client.get('/api/bank/1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_etag_depends_on_fields(client, bank_api):
+    assert client.get('/api/bank/1').headers['ETag'] != \
+        client.get('/api/bank/1?fields=name').headers['ETag']
+
+
+def test_if_match(client, bank_api):
+    etag = client.get('/api/bank/1').headers['ETag']
+
+    resp = client.patch('/api/bank/1', json={'cuit': '5'}, headers={'If-Match': '"stale"'})
+    assert resp.status_code == 412
+
+    resp = client.patch('/api/bank/1', json={'cuit': '5'}, headers={'If-Match': etag})
+    assert resp.status_code == 200
+
+    resp = client.delete('/api/bank/1', headers={'If-Match': etag})
+    assert resp.status_code == 412
+
+
+def test_versioned_etag(client, documents):
+    etag = client.get('/api/document/1').headers['ETag']
+    assert client.get('/api/document/1', headers={'If-None-Match': etag}).status_code == 304
+
+    client.patch('/api/document/1', json={'title': 'changed'})
+    assert client.get('/api/document/1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_bulk_update_changes_versions(client, documents):
+    etag = client.get('/api/document/1').headers['ETag']
+
+    resp = client.patch('/api/document?ids=1', json={'title': 'changed'})
+    assert resp.get_json() == {'affected': 1}
+
+    resp = client.get('/api/document/1', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.get_json()['title'] == 'changed'
+    assert resp.get_json()['version'] == 2
+    assert client.get('/api/document/2').get_json()['version'] == 1
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import db, Bank, Event, model_resource
+
+
+@pytest.fixture
+def bank_api(app, api, banks):
+    app.config['TONIC_STREAM_BATCH_SIZE'] = 2
+    api.register_resource(model_resource(Bank))
+    return api
+
+
+def test_ndjson(client, bank_api):
+    resp = client.get('/api/bank/export')
+
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.mimetype == 'application/x-ndjson'
+    assert resp.headers['Content-Disposition'] == 'attachment; filename="bank.ndjson"'
+    assert [json.loads(line) for line in resp.get_data(as_text=True).splitlines()] == [
+        {'id': 1, 'name': 'bank 0', 'cuit': None},
+        {'id': 2, 'name': 'bank 1', 'cuit': None},
+        {'id': 3, 'name': 'bank 2', 'cuit': None},
+    ]
+
+
+def test_csv(client, bank_api):
+    client.patch('/api/bank/2', json={'cuit': '5'})
+    resp = client.get('/api/bank/export?format=csv&sort=-id&fields=name,cuit')
+
+    assert resp.mimetype == 'text/csv'
+    assert resp.headers['Content-Disposition'] == 'attachment; filename="bank.csv"'
+    assert list(csv.reader(io.StringIO(resp.get_data(as_text=True)))) == [
+        ['name', 'cuit'], ['bank 2', ''], ['bank 1', '5'], ['bank 0', ''],
+    ]
+
+
+def test_where(client, bank_api):
+    resp = client.get('/api/bank/export?fields=id&where={"id":{"$gt":1}}')
+    assert [json.loads(line) for line in resp.get_data(as_text=True).splitlines()] == \
+        [{'id': 2}, {'id': 3}]
+
+
+def test_nothing_to_export(client, bank_api):
+    where = '&where={"name":"missing"}'
+    assert client.get('/api/bank/export?format=ndjson' + where).get_data() == b''
+    assert client.get('/api/bank/export?format=csv&fields=id' + where).get_data() == b'id\r\n'
+
+
+def test_values_match_the_json_form(client, api):
+    api.register_resource(model_resource(Event))
+    db.session.add(Event(at=datetime(2020, 1, 2, 3, 4, 5), score=7))
+    db.session.commit()
+
+    exported = json.loads(client.get('/api/event/export').get_data(as_text=True))
+    assert exported == client.get('/api/event/1').get_json()
+
+
+@pytest.mark.parametrize('query', [
+    'format=xml',
+    'fields=branches',
+    'fields=secret',
+    'where={"secret":1}',
+])
+def test_invalid_export(client, bank_api, query):
+    assert client.get('/api/bank/export?' + query).status_code == 400
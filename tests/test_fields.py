@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import event
+
+from conftest import db, Bank, Branch, model_resource
+
+
+@pytest.fixture
+def bank_api(api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+    return api
+
+
+@pytest.fixture
+def statements(app):
+    """Collects the SQL statements run on the engine"""
+    collected = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        collected.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    yield collected
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def test_instances_fields(client, bank_api, statements):
+    resp = client.get('/api/bank?fields=name&count=false')
+
+    assert resp.status_code == 200
+    assert resp.get_json() == [{'name': 'bank 0'}, {'name': 'bank 1'}, {'name': 'bank 2'}]
+    assert len(statements) == 1
+    assert 'bank.name' in statements[0]
+    assert 'bank.cuit' not in statements[0]
+
+
+def test_read_fields(client, bank_api, statements):
+    resp = client.get('/api/bank/2?fields=id,branches')
+
+    assert resp.get_json() == {'id': 2, 'branches': [3, 4]}
+    assert not any('bank.cuit' in statement for statement in statements)
+
+
+def test_sort_by_unrequested_field(client, bank_api):
+    resp = client.get('/api/bank?fields=id&sort=-name')
+    assert resp.get_json() == [{'id': 3}, {'id': 2}, {'id': 1}]
+
+
+def test_unknown_field(client, bank_api):
+    resp = client.get('/api/bank?fields=name,secret')
+
+    assert resp.status_code == 400
+    assert resp.get_json()['field'] == 'secret'
+    assert client.get('/api/bank/1?fields=secret').status_code == 400
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import json
+from datetime import datetime
+
+import pytest
+
+from conftest import db, Bank, Event, model_resource
+
+
+@pytest.fixture
+def bank_api(api, banks):
+    db.session.add_all([Bank(name='50% off', cuit='1'), Bank(name='50_50', cuit='2'),
+                        Bank(name='back\\slash')])
+    db.session.commit()
+    api.register_resource(model_resource(Bank))
+    return api
+
+
+def ids(client, where, url='/api/bank'):
+    resp = client.get(url, query_string={'where': json.dumps(where), 'sort': 'id'})
+    assert resp.status_code == 200, resp.get_json()
+    return [item['id'] for item in resp.get_json()]
+
+
+@pytest.mark.parametrize('where, expected', [
+    ({'name': 'bank 1'}, [2]),
+    ({'name': {'$eq': 'bank 1'}}, [2]),
+    ({'name': {'$ne': 'bank 1'}}, [1, 3, 4, 5, 6]),
+    ({'id': {'$lt': 3}}, [1, 2]),
+    ({'id': {'$gt': 2, '$lt': 5}}, [3, 4]),
+    ({'id': {'$in': [1, 3, 9]}}, [1, 3]),
+    ({'cuit': {'$null': True}}, [1, 2, 3, 6]),
+    ({'cuit': {'$null': False}}, [4, 5]),
+    ({'name': {'$startswith': 'bank'}}, [1, 2, 3]),
+    ({'name': {'$contains': 'k 2'}}, [3]),
+    ({'name': {'$startswith': 'bank'}, 'id': {'$gt': 1}}, [2, 3]),
+])
+def test_operators(client, bank_api, where, expected):
+    assert ids(client, where) == expected
+
+
+@pytest.mark.parametrize('where, expected', [
+    ({'name': {'$startswith': '50%'}}, [4]),
+    ({'name': {'$startswith': '50_'}}, [5]),
+    ({'name': {'$contains': '%'}}, [4]),
+    ({'name': {'$contains': '_'}}, [5]),
+    ({'name': {'$contains': '\\'}}, [6]),
+])
+def test_like_wildcards_are_escaped(client, bank_api, where, expected):
+    assert ids(client, where) == expected
+
+
+def test_values_are_converted(client, api):
+    api.register_resource(model_resource(Event))
+    db.session.add_all([Event(at=datetime(2020, 1, day), score=day) for day in (1, 2, 3)])
+    db.session.commit()
+
+    assert ids(client, {'at': {'$gt': '2020-01-01T12:00:00'}}, '/api/event') == [2, 3]
+
+    resp = client.get('/api/event', query_string={'where': '{"at": {"$gt": "soon"}}'})
+    assert resp.status_code == 400
+    assert resp.get_json()['field'] == 'at'
+
+
+@pytest.mark.parametrize('where', [
+    'not json',
+    '[1, 2]',
+    '{"secret": 1}',
+    '{"name": {"$like": "bank%"}}',
+    '{"id": {"$in": 1}}',
+    '{"cuit": {"$null": "yes"}}',
+])
+def test_invalid_where(client, bank_api, where):
+    resp = client.get('/api/bank', query_string={'where': where})
+    assert resp.status_code == 400
+
+
+def test_filters_allowed_by_meta(client, api, banks):
+    api.register_resource(model_resource(Bank, filters={'name': ['eq'], 'id': True}))
+
+    assert ids(client, {'name': 'bank 0'}) == [1]
+    assert ids(client, {'id': {'$in': [2]}}) == [2]
+    assert client.get('/api/bank?where={"name":{"$contains":"a"}}').status_code == 400
+    assert client.get('/api/bank?where={"cuit":"1"}').status_code == 400
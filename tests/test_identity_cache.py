@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import event
+
+from tonic import Api
+
+from conftest import db, Bank, model_resource
+
+
+@pytest.fixture
+def statements(app):
+    """Collects the SQL statements run on the engine"""
+    collected = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        collected.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    yield collected
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+@pytest.fixture
+def resource(api, banks):
+    resource = model_resource(Bank, identity_cache=True)
+    api.register_resource(resource)
+    return resource
+
+
+def test_reads_are_cached(client, resource, statements):
+    first = client.get('/api/bank/1')
+    del statements[:]
+
+    second = client.get('/api/bank/1')
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert statements == []
+
+    resp = client.get('/api/bank/1', headers={'If-None-Match': first.headers['ETag']})
+    assert resp.status_code == 304
+
+
+def test_fields_come_from_the_cached_item(client, resource, statements):
+    client.get('/api/bank/2')
+    del statements[:]
+
+    resp = client.get('/api/bank/2?fields=name,branches')
+    assert resp.get_json() == {'name': 'bank 1', 'branches': [3, 4]}
+    assert resp.headers['ETag'] != client.get('/api/bank/2').headers['ETag']
+    assert statements == []
+
+
+def test_writes_drop_cached_items(client, resource):
+    client.get('/api/bank/1')
+    client.get('/api/bank/2')
+    client.get('/api/bank/3')
+    cache = resource.manager.identity_cache
+
+    client.patch('/api/bank/1', json={'cuit': '5'})
+    assert cache.get('1') is None and len(cache) == 2
+    assert client.get('/api/bank/1').get_json()['cuit'] == '5'
+
+    client.delete('/api/bank/2')
+    assert cache.get('2') is None and len(cache) == 1
+    assert client.get('/api/bank/2').status_code == 404
+
+    # bulk writes don't know which items they change
+    client.patch('/api/bank?ids=3', json={'cuit': '7'})
+    assert len(cache) == 0
+    assert client.get('/api/bank/3').get_json()['cuit'] == '7'
+
+
+def test_read_your_writes_skips_the_cache(client, resource, statements):
+    client.get('/api/bank/1')
+    del statements[:]
+
+    client.get('/api/bank/1', headers={'X-Read-Your-Writes': '1'})
+    assert statements != []
+
+
+def test_hits_and_misses(client, resource):
+    client.get('/api/bank/1')
+    client.get('/api/bank/1')
+    client.get('/api/bank/1')
+    client.get('/api/bank/9')
+
+    cache = resource.manager.identity_cache
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert len(cache) == 1
+
+
+def test_counters_in_metrics(app, client, banks):
+    app.config['TONIC_METRICS'] = True
+    api = Api(app, prefix='/api')
+    api.register_resource(model_resource(Bank, identity_cache=True))
+
+    client.get('/api/bank/1')
+    client.get('/api/bank/1')
+
+    text = client.get('/api/_metrics').get_data(as_text=True)
+    assert 'tonic_identity_cache_hits_total{resource="bank"} 1' in text
+    assert 'tonic_identity_cache_misses_total{resource="bank"} 1' in text
+    assert 'tonic_identity_cache_entries{resource="bank"} 1' in text
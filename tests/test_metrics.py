@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from tonic import Api
+from tonic.metrics import Histogram
+
+from conftest import Bank, model_resource
+
+
+@pytest.fixture
+def metrics_api(app, banks):
+    app.config['TONIC_METRICS'] = True
+    api = Api(app, prefix='/api')
+    api.register_resource(model_resource(Bank))
+    return api
+
+
+def samples(client):
+    """Returns the metrics as a mapping of series to value"""
+    resp = client.get('/api/_metrics')
+    assert resp.status_code == 200
+    assert resp.mimetype == 'text/plain'
+
+    lines = [line for line in resp.get_data(as_text=True).splitlines()
+             if line and not line.startswith('#')]
+    return dict(line.rsplit(' ', 1) for line in lines)
+
+
+def test_histogram_buckets():
+    histogram = Histogram((1, 5))
+    for value in (0, 1, 2, 7):
+        histogram.observe(value)
+
+    assert list(histogram.samples()) == [('1', 2), ('5', 3), ('+Inf', 4)]
+    assert (histogram.sum, histogram.count) == (10, 4)
+
+
+def test_requests_by_endpoint_and_status(client, metrics_api):
+    client.get('/api/bank/1')
+    client.get('/api/bank/1')
+    client.get('/api/bank/9')
+    client.get('/api/bank')
+
+    metrics = samples(client)
+    assert metrics['tonic_requests_total{endpoint="bank.self",status="200"}'] == '2'
+    assert metrics['tonic_requests_total{endpoint="bank.self",status="404"}'] == '1'
+    assert metrics['tonic_requests_total{endpoint="bank.instances",status="200"}'] == '1'
+    assert metrics['tonic_request_duration_seconds_count{endpoint="bank.self"}'] == '3'
+    assert metrics['tonic_response_size_bytes_count{endpoint="bank.self"}'] == '3'
+
+    # the metrics endpoint is not measured itself
+    assert not any('_metrics' in series for series in samples(client))
+
+
+def test_sql_queries_per_request(client, metrics_api):
+    client.get('/api/bank/9')
+    client.get('/api/bank?count=false&fields=name')
+
+    metrics = samples(client)
+    assert metrics['tonic_sql_queries_bucket{endpoint="bank.self",le="0"}'] == '0'
+    assert metrics['tonic_sql_queries_bucket{endpoint="bank.self",le="1"}'] == '1'
+    assert metrics['tonic_sql_queries_sum{endpoint="bank.instances"}'] == '1'
+    assert metrics['tonic_sql_duration_seconds_count{endpoint="bank.instances"}'] == '1'
+
+
+def test_metrics_are_off_by_default(client, api):
+    assert client.get('/api/_metrics').status_code == 404
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import pytest
+
+from conftest import db, Bank, Event, model_resource
+
+BASE = datetime.datetime(2020, 1, 1, 12, 0, 0, 123456)
+
+
+@pytest.fixture
+def events(api):
+    api.register_resource(model_resource(Event))
+
+    # repeated times and scores, every third score NULL
+    for i in range(10):
+        db.session.add(Event(at=BASE + datetime.timedelta(seconds=i // 2),
+                             score=None if i % 3 == 0 else i % 4))
+    db.session.commit()
+
+
+def walk(client, url):
+    """Returns the ids of every page, following the ``next`` links"""
+    ids = []
+
+    while url:
+        resp = client.get(url)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        ids.extend(item['id'] for item in resp.get_json())
+
+        url = None
+        for link in resp.headers['Link'].split(', '):
+            target, rel = link.split('; ')
+            if rel == 'rel="next"':
+                url = target[1:-1].replace('http://localhost', '')
+
+    return ids
+
+
+@pytest.mark.parametrize('sort', ['at', '-at', 'score', '-score', '-score,at', 'score,-at'])
+def test_cursor_pages_match_single_page(client, events, sort):
+    expected = [item['id'] for item in
+                client.get('/api/event?per_page=100&sort=' + sort).get_json()]
+
+    assert sorted(expected) == list(range(1, 11))
+    assert walk(client, '/api/event?per_page=3&sort=' + sort) == expected
+
+
+def test_nulls_sort_last_then_first_when_reversed(client, events):
+    scores = [item['score'] for item in client.get('/api/event?per_page=100&sort=score').get_json()]
+    assert scores[-4:] == [None] * 4
+
+    scores = [item['score'] for item in client.get('/api/event?per_page=100&sort=-score').get_json()]
+    assert scores[:4] == [None] * 4
+
+
+def test_invalid_cursor(client, events):
+    resp = client.get('/api/event?cursor=bogus')
+    assert resp.status_code == 400
+    assert resp.get_json()['message'] == 'Invalid cursor'
+
+
+@pytest.mark.parametrize('query, argument', [
+    ('page=0', 'page'),
+    ('per_page=x', 'per_page'),
+])
+def test_invalid_arguments_are_json(client, api, query, argument):
+    api.register_resource(model_resource(Bank))
+
+    resp = client.get('/api/bank?' + query)
+    assert resp.status_code == 400
+    assert resp.mimetype == 'application/json'
+    assert argument in resp.get_json()['errors']
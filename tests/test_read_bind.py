@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from flask import Flask
+
+from tonic.sqla_manager import read_your_writes
+
+from conftest import db, Bank, model_resource
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_BINDS'] = {'replica': 'sqlite://'}
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TONIC_READ_BIND'] = 'replica'
+    db.init_app(app)
+
+    with app.app_context():
+        replica = db.get_engine(app, bind='replica')
+        db.create_all()
+        db.Model.metadata.create_all(bind=replica)
+
+        # tell the databases apart by the names of their banks
+        db.session.add(Bank(name='primary'))
+        db.session.commit()
+        replica.execute(Bank.__table__.insert(), [{'name': 'replica'}])
+
+    # no app context around requests, g must not outlive one
+    yield app
+
+    with app.app_context():
+        db.drop_all()
+        db.Model.metadata.drop_all(bind=replica)
+
+
+def name(resp):
+    assert resp.status_code == 200
+    return resp.get_json()['name']
+
+
+def test_reads_go_to_the_replica(client, api):
+    api.register_resource(model_resource(Bank))
+
+    assert name(client.get('/api/bank/1')) == 'replica'
+    assert [item['name'] for item in client.get('/api/bank').get_json()] == ['replica']
+    assert client.head('/api/bank').headers['X-Total-Count'] == '1'
+
+
+def test_writes_go_to_the_primary(app, client, api):
+    api.register_resource(model_resource(Bank))
+
+    assert name(client.patch('/api/bank/1', json={'cuit': '5'})) == 'primary'
+    assert client.get('/api/bank/1').get_json()['cuit'] is None
+
+    client.delete('/api/bank/1')
+    with app.app_context():
+        assert Bank.query.get(1) is None
+    assert name(client.get('/api/bank/1')) == 'replica'
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1', 'primary'),
+    ('true', 'primary'),
+    ('false', 'replica'),
+])
+def test_read_your_writes_header(client, api, value, expected):
+    api.register_resource(model_resource(Bank))
+
+    resp = client.get('/api/bank/1', headers={'X-Read-Your-Writes': value})
+    assert name(resp) == expected
+
+
+def test_read_your_writes_hook(app, client, api):
+    api.register_resource(model_resource(Bank))
+    app.before_request(read_your_writes)
+
+    assert name(client.get('/api/bank/1')) == 'primary'
+
+
+def test_resource_read_bind(app, client, api):
+    app.config['TONIC_READ_BIND'] = None
+    api.register_resource(model_resource(Bank, read_bind='replica'))
+
+    assert name(client.get('/api/bank/1')) == 'replica'
+
+
+def test_reads_after_a_write_go_to_the_primary(client, api):
+    api.register_resource(model_resource(Bank))
+
+    resp = client.post('/api/_batch', json=[
+        {'path': '/api/bank/1'},
+        {'method': 'PATCH', 'path': '/api/bank/1', 'body': {'cuit': '5'}},
+        {'path': '/api/bank/1'},
+    ])
+    assert [entry['body']['name'] for entry in resp.get_json()] == \
+        ['replica', 'primary', 'primary']
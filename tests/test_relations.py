@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from conftest import Bank, Branch, Tag, model_resource
+
+
+def links(client):
+    return set(link['rel'] for link in client.get('/api/bank/schema').get_json()['links'])
+
+
+def test_relations_wait_for_their_target_resource(client, api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+
+    assert 'branches' in links(client)
+    assert 'tags' not in links(client)
+    assert client.get('/api/bank/1/tags').status_code == 404
+
+    api.register_resource(model_resource(Tag))
+
+    assert 'tags' in links(client)
+    assert client.get('/api/bank/1/tags').get_json() == []
+
+
+def test_relation_instances(client, api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+
+    resp = client.get('/api/bank/2/branches?per_page=1')
+    assert [item['id'] for item in resp.get_json()] == [3]
+    assert 'rel="next"' in resp.headers['Link']
+
+
+def test_relations_are_read_only_by_default(client, api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+
+    assert 'addBranches' not in links(client)
+    assert client.put('/api/bank/1/branches/3').status_code == 404
+    assert client.delete('/api/bank/1/branches/1').status_code == 404
+    assert client.get('/api/bank/1/branches').get_json()[0]['id'] == 1
+
+
+def test_relation_writes_are_opt_in(client, api, banks):
+    api.register_resource(model_resource(Bank, relations={'branches': 'rw', 'tags': 'r'}))
+    api.register_resource(model_resource(Branch))
+    api.register_resource(model_resource(Tag))
+
+    assert {'addBranches', 'removeBranches', 'tags'} <= links(client)
+    assert 'addTags' not in links(client)
+
+    resp = client.put('/api/bank/1/branches/3')
+    assert resp.status_code == 200
+    assert resp.get_json()['bank'] == 1
+
+    assert client.delete('/api/bank/1/branches/1').status_code == 204
+    assert [item['id'] for item in client.get('/api/bank/1/branches').get_json()] == [2, 3]
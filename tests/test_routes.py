@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import db, Bank, Tag, model_resource
+
+
+@pytest.fixture
+def routes_api(api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Tag))
+    db.session.add(Tag(name='tag'))
+    db.session.commit()
+    return api
+
+
+@pytest.mark.parametrize('url', ['/api/bank/1', '/api/tag/1'])
+def test_empty_patch_changes_nothing(client, routes_api, url):
+    before = client.get(url).get_json()
+
+    resp = client.patch(url, json={})
+    assert resp.status_code == 200
+    assert resp.get_json() == before
+
+
+def test_patch_passes_parsed_body(client, routes_api):
+    resp = client.patch('/api/bank/1', json={'cuit': '5'})
+    assert resp.status_code == 200
+    assert resp.get_json()['cuit'] == '5'
+
+
+def test_invalid_body(client, routes_api):
+    resp = client.post('/api/bank', json={'name': 5})
+    assert resp.status_code == 400
+    assert 'name' in resp.get_json()['errors']
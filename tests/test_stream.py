@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from conftest import Bank, Branch, model_resource
+
+
+@pytest.fixture
+def branch_api(app, api, banks):
+    app.config['TONIC_STREAM_BATCH_SIZE'] = 4
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+    return api
+
+
+def test_stream_returns_every_item(client, branch_api):
+    resp = client.get('/api/branch?stream=true')
+
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.mimetype == 'application/json'
+    assert [item['id'] for item in json.loads(resp.get_data())] == [1, 2, 3, 4, 5, 6]
+    assert resp.get_json() == client.get('/api/branch').get_json()
+
+
+def test_stream_chunks(client, branch_api):
+    resp = client.get('/api/branch?stream=true&fields=id')
+
+    # whichever encoder is installed, one chunk per batch of items
+    chunks = list(resp.response)
+    assert len(chunks) == 4
+    assert (chunks[0], chunks[-1]) == (b'[', b']')
+    assert json.loads(b'[' + chunks[1] + b']') == [{'id': 1}, {'id': 2}, {'id': 3}, {'id': 4}]
+    assert json.loads(b'[' + chunks[2][1:] + b']') == [{'id': 5}, {'id': 6}]
+
+
+def test_stream_filters_and_sorts(client, branch_api):
+    resp = client.get('/api/branch?stream=true&sort=-id&fields=name'
+                      '&where={"name":{"$startswith":"branch 1"}}')
+    assert resp.get_json() == [{'name': 'branch 1.1'}, {'name': 'branch 1.0'}]
+
+
+def test_stream_without_items(client, branch_api):
+    resp = client.get('/api/branch?stream=true&where={"name":"missing"}')
+    assert resp.get_data() == b'[]'
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import event
+
+from tonic.exceptions import VersionConflict
+
+from conftest import db, Document, model_resource
+
+
+@pytest.fixture
+def resource(api):
+    resource = model_resource(Document)
+    api.register_resource(resource)
+    db.session.add(Document(title='first'))
+    db.session.commit()
+    return resource
+
+
+@pytest.fixture
+def updates(app):
+    """Collects the UPDATE statements run on the engine"""
+    collected = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE'):
+            collected.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    yield collected
+    event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def test_update_bumps_the_version(client, resource):
+    resp = client.patch('/api/document/1', json={'title': 'changed', 'version': 1})
+
+    assert resp.status_code == 200
+    assert resp.get_json() == {'id': 1, 'title': 'changed', 'version': 2}
+
+
+def test_stale_version_in_body(client, resource):
+    client.patch('/api/document/1', json={'title': 'changed'})
+
+    resp = client.patch('/api/document/1', json={'title': 'lost', 'version': 1})
+    assert resp.status_code == 409
+    assert resp.get_json()['message'] == 'Version conflict'
+    assert client.get('/api/document/1').get_json()['title'] == 'changed'
+
+
+def test_unchanged_update_writes_nothing(client, resource, updates):
+    resp = client.patch('/api/document/1', json={'title': 'first', 'version': 1})
+
+    assert resp.status_code == 200
+    assert resp.get_json()['version'] == 1
+    assert updates == []
+
+
+def test_concurrent_update(app, resource):
+    manager = resource.manager
+    item = manager.read(1)
+
+    # another writer gets there first
+    db.session.execute(Document.__table__.update().values(version=Document.version + 1))
+
+    with app.test_request_context('/api/document/1', method='PATCH'):
+        with pytest.raises(VersionConflict):
+            manager.update(item, {'title': 'lost'})
+
+    db.session.remove()
+    assert Document.query.get(1).title == 'first'
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from tonic.sqla_manager import SQLAlchemyManager
+
+from conftest import Bank, Branch, model_resource
+
+
+class SlowManager(SQLAlchemyManager):
+
+    def _init_schema(self, resource, model, meta):
+        super(SlowManager, self)._init_schema(resource, model, meta)
+        time.sleep(0.05)
+
+
+def test_schemas_are_built_on_first_use(api, client, banks):
+    resource = model_resource(Bank)
+    api.register_resource(resource)
+    assert not resource.manager._built
+
+    assert client.get('/api/bank/1').status_code == 200
+    assert resource.manager._built
+
+
+def test_warmup_builds_every_resource(app, api):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+
+    timings = api.warmup()
+
+    assert sorted(timings) == ['bank', 'branch']
+    assert all(resource.manager._built for resource in api.resources.values())
+
+
+def test_readers_wait_for_the_build(app, api):
+    resource = model_resource(Bank, manager=SlowManager)
+    api.register_resource(resource)
+    manager = resource.manager
+    seen = []
+
+    def read():
+        seen.append((manager.schema_class, manager.filters))
+
+    builder = threading.Thread(target=manager.build)
+    builder.start()
+    time.sleep(0.01)
+    reader = threading.Thread(target=read)
+    reader.start()
+    builder.join()
+    reader.join()
+
+    schema_class, filters = seen[0]
+    assert schema_class is not None
+    assert 'name' in filters
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import event
+
+from conftest import db, Bank, Branch, Tag, model_resource
+
+
+@pytest.fixture
+def tags(api):
+    resource = model_resource(Tag)
+    api.register_resource(resource)
+
+    db.session.add_all([Tag(name='tag %d' % i) for i in range(3)])
+    db.session.commit()
+    return resource
+
+
+@pytest.fixture
+def commits(app):
+    """Counts the transactions committed on the engine"""
+    count = []
+    listener = lambda conn: count.append(1)
+
+    event.listen(db.engine, 'commit', listener)
+    yield count
+    event.remove(db.engine, 'commit', listener)
+
+
+def test_fast_path_is_used(tags):
+    assert tags.manager.load_free_writes
+
+
+def test_patch_updates_without_loading(client, tags, commits):
+    resp = client.patch('/api/tag/1', json={'name': 'renamed'})
+
+    assert resp.status_code == 200
+    assert resp.get_json()['name'] == 'renamed'
+    assert resp.get_json()['revision'] != 0
+    assert len(commits) == 1
+    assert client.get('/api/tag/1').get_json()['name'] == 'renamed'
+
+
+def test_patch_changing_nothing_writes_nothing(client, tags, commits):
+    revision = client.patch('/api/tag/1', json={'name': 'renamed'}).get_json()['revision']
+
+    resp = client.patch('/api/tag/1', json={'name': 'renamed'})
+    assert resp.status_code == 200
+    assert resp.get_json() == {'id': 1, 'name': 'renamed', 'revision': revision}
+    assert len(commits) == 1
+
+
+def test_patch_unknown_item(client, tags):
+    resp = client.patch('/api/tag/99', json={'name': 'renamed'})
+    assert resp.status_code == 404
+
+
+def test_delete_without_loading(client, tags, commits):
+    assert client.delete('/api/tag/1').status_code == 204
+    assert len(commits) == 1
+    assert client.get('/api/tag/1').status_code == 404
+    assert client.delete('/api/tag/1').status_code == 404
+
+
+def test_bulk_create_with_many_to_one(client, api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+
+    resp = client.post('/api/branch', json=[{'name': 'a', 'bank': 1},
+                                            {'name': 'b', 'bank': 2},
+                                            {'name': 'c'}])
+    assert resp.status_code == 201
+    assert [result['status'] for result in resp.get_json()] == [201, 201, 201]
+
+    created = client.get('/api/branch?sort=-id&per_page=3').get_json()
+    assert [(item['name'], item['bank']) for item in created] == \
+        [('c', None), ('b', 2), ('a', 1)]
+
+
+def test_bulk_create_with_collections(client, api, banks):
+    api.register_resource(model_resource(Bank))
+    api.register_resource(model_resource(Branch))
+    api.register_resource(model_resource(Tag))
+    db.session.add(Tag(name='tag'))
+    db.session.commit()
+
+    resp = client.post('/api/bank', json=[{'name': 'first', 'branches': [1, 2], 'tags': [1]},
+                                          {'name': 'second'}])
+    assert resp.status_code == 201
+
+    created = client.get('/api/bank?sort=id&where={"id":{"$gt":3}}').get_json()
+    assert [(item['name'], item['branches'], item['tags']) for item in created] == \
+        [('first', [1, 2], [1]), ('second', [], [])]
+
+
+def test_bulk_create_empty_list(client, api):
+    api.register_resource(model_resource(Bank))
+
+    resp = client.post('/api/bank', json=[])
+    assert resp.status_code == 201
+    assert resp.get_json() == []
+
+
+@pytest.mark.parametrize('method, url', [
+    ('PATCH', '/api/bank/1'),
+    ('PATCH', '/api/tag/1'),
+    ('PATCH', '/api/bank?ids=1'),
+])
+def test_lists_are_only_accepted_by_create(client, api, banks, tags, method, url):
+    api.register_resource(model_resource(Bank))
+
+    resp = client.open(url, method=method, json=[1])
+    assert resp.status_code == 400
+    assert client.get('/api/bank/1').get_json()['name'] == 'bank 0'
@@ -2,22 +2,42 @@
 
 from collections import OrderedDict
 import operator
+import hashlib
 import inspect
+import logging
+import time
+import uuid
+import six
 from six import wraps
-from flask import make_response, json, current_app
+from flask import make_response, current_app, request, g, json, has_app_context
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.urls import url_encode
 from werkzeug.wrappers import BaseResponse
 
-from .routes import RouteSet, Route
-from .utils import unpack
-from .resource import Resource, ModelResource
+from .cache import LRUCache
+from .encoders import get_encoder
+from .metrics import Metrics
+from .exceptions import TonicException, InvalidRequest
+from .routes import Route
+from .utils import unpack, reads_own_writes
+from .resource import Resource, ModelResource, Relation
 
-def _make_response(data, code, headers=None):
-    settings = {}
-    if current_app.debug:
-        settings.setdefault('indent', 4)
-        settings.setdefault('sort_keys', True)
+logger = logging.getLogger(__name__)
 
-    data = json.dumps(data, **settings)
+# request headers a decorated route may authenticate with
+CREDENTIAL_HEADERS = ('Authorization', 'Cookie')
+
+def _pretty():
+    value = request.args.get('pretty')
+    return value is not None and value.lower() not in ('0', 'false')
+
+
+def _make_response(data, code, headers=None, pretty=None):
+    if pretty is None:
+        pretty = _pretty()
+
+    dumps = get_encoder(current_app.config['TONIC_JSON_ENCODER'])
+    data = dumps(data, pretty=pretty)
 
     resp = make_response(data, code)
     resp.headers.extend(headers or {})
@@ -28,7 +48,7 @@ def _make_response(data, code, headers=None):
 class Api(object):
 
     def __init__(self, app=None, prefix=None, title=None, description=None,
-                 default_manager=None):
+                 default_manager=None, cache=None):
         self.app = app
         self.blueprint = None
         self.prefix = prefix or ''
@@ -37,6 +57,10 @@ class Api(object):
         self.endpoints = set()
         self.resources = {}
         self.views = []
+        self.cache = cache
+        self.metrics = None
+        self._encoded_schemas = {}
+        self._pending_relations = []
 
         self.default_manager = None
         if default_manager is None:
@@ -70,6 +94,25 @@ class Api(object):
     def _init_app(self, app):
         app.config.setdefault('TONIC_MAX_PER_PAGE', 100)
         app.config.setdefault('TONIC_DEFAULT_PER_PAGE', 20)
+        app.config.setdefault('TONIC_STREAM_BATCH_SIZE', 1000)
+        app.config.setdefault('TONIC_BULK_CHUNK_SIZE', None)
+        app.config.setdefault('TONIC_CACHE_MAX_SIZE', 1024)
+        app.config.setdefault('TONIC_CACHE_TIMEOUT', 300)
+        app.config.setdefault('TONIC_JSON_ENCODER', 'auto')
+        app.config.setdefault('TONIC_MAX_EMBED_DEPTH', 2)
+        app.config.setdefault('TONIC_COUNT_TIMEOUT', 60)
+        app.config.setdefault('TONIC_ASYNC_DATABASE_URI', None)
+        app.config.setdefault('TONIC_ASYNC_ENGINE_OPTIONS', {})
+        app.config.setdefault('TONIC_METRICS', False)
+        app.config.setdefault('TONIC_MAX_BATCH_SIZE', 50)
+        app.config.setdefault('TONIC_READ_BIND', None)
+        app.config.setdefault('TONIC_IDENTITY_CACHE_SIZE', 1024)
+        app.config.setdefault('TONIC_IDENTITY_CACHE_TIMEOUT', 60)
+        app.config.setdefault('TONIC_READ_YOUR_WRITES_HEADER', 'X-Read-Your-Writes')
+
+        if self.cache is None:
+            self.cache = LRUCache(max_size=app.config['TONIC_CACHE_MAX_SIZE'],
+                                  timeout=app.config['TONIC_CACHE_TIMEOUT'])
 
         self._register_view(app,
                             rule=''.join((self.prefix, '/schema')),
@@ -78,9 +121,29 @@ class Api(object):
                             methods=['GET'],
                             relation='describedBy')
 
+        self._register_view(app,
+                            rule=''.join((self.prefix, '/_batch')),
+                            view_func=self._batch_view,
+                            endpoint='_batch',
+                            methods=['POST'],
+                            relation='batch')
+
+        app.teardown_appcontext(self._remove_read_sessions)
+
+        if app.config['TONIC_METRICS']:
+            self.metrics = Metrics()
+            app.before_request(self._start_metrics)
+            app.after_request(self._finish_metrics)
+            self._register_view(app,
+                                rule=''.join((self.prefix, '/_metrics')),
+                                view_func=self._metrics_view,
+                                endpoint='_metrics',
+                                methods=['GET'],
+                                relation='metrics')
+
         for route, resource, view_func, endpoint, methods, relation in self.views:
             rule = route.rule_factory(resource)
-            self._register_view(app, rule, view_func, endpoint, methods, relation)
+            self._register_view(app, rule, view_func, endpoint, methods, relation, resource)
         # TODO: setup error handlers
 
     def add_route(self, route, resource, endpoint=None, decorator=None):
@@ -90,11 +153,15 @@ class Api(object):
 
         view_func = route.view_factory(endpoint, resource)
 
+        # cache hits are served past the decorator, never around it
+        view_func = self.cached(view_func, resource, private=decorator is not None)
+
         if decorator:
             view_func = decorator(view_func)
 
         if self.app and not self.blueprint:
-            self._register_view(self.app, rule, view_func, endpoint, methods, route.relation)
+            self._register_view(self.app, rule, view_func, endpoint, methods,
+                                route.relation, resource)
         else:
             self.views.append((route, resource, view_func, endpoint, methods, route.relation))
 
@@ -108,51 +175,350 @@ class Api(object):
 
         # check that each model resource has a manager; if not, initialize it.
         if issubclass(resource, ModelResource) and resource.manager is None:
-            if self.default_manager:
-                resource.manager = self.default_manager(resource, resource.meta.get('model'))
+            manager = resource.meta.get('manager') or self.default_manager
+            if manager:
+                resource.manager = manager(resource, resource.meta.get('model'))
             else:
                 raise RuntimeError("'{}' has no manager, fix please."
                                    .format(resource.meta.name))
 
         resource.api = self
+        self._encoded_schemas.clear()
         resource.route_prefix = ''.join((self.prefix, '/', resource.meta.name))
 
         for route in resource.routes.values():
             route_decorator = resource.meta.route_decorators.get(route.relation, None)
             self.add_route(route, resource, decorator=route_decorator)
 
-        for name, rset in inspect.getmembers(resource, lambda m: isinstance(m, RouteSet)):
-            if rset.attribute is None:
-                rset.attribute = name
-            for i, route in enumerate(rset.routes()):
-                if route.attribute is None:
-                    route.attribute = '{}_{}'.format(rset.attribute, i)
-                resource.routes['{}_{}'.format(rset.attribute, route.relation)] = route
-                self.add_route(route, resource)
+        route_sets = [rset for _, rset in sorted(resource.route_sets.items())]
 
-        self.resources[resource.meta.name] = resource
+        if issubclass(resource, ModelResource):
+            route_sets += resource._relation_route_sets(route_sets)
 
-    def _register_view(self, app, rule, view_func, endpoint, methods, relation):
-        view_func = self.output(view_func)
+        for rset in route_sets:
+            if isinstance(rset, Relation):
+                self._pending_relations.append((resource, rset))
+            else:
+                self._add_route_set(rset, resource)
+
+        self.resources[resource.meta.name] = resource
+        self._add_relations()
+
+    def _add_route_set(self, rset, resource):
+        for i, route in enumerate(rset.routes()):
+            if route.attribute is None:
+                route.attribute = '{}_{}'.format(rset.attribute, i)
+            resource.routes['{}_{}'.format(rset.attribute, route.relation)] = route
+            self.add_route(route, resource)
+
+    def _add_relations(self):
+        """
+        Adds the routes of every relation whose target resource is now
+        registered; the others wait for it.
+        """
+        pending = []
+
+        for resource, rset in self._pending_relations:
+            if rset.find_target(resource) is None:
+                pending.append((resource, rset))
+            else:
+                self._add_route_set(rset, resource)
+
+        self._pending_relations = pending
+
+    def warmup(self, app=None):
+        """
+        Builds now what registered resources otherwise build on their first
+        request (schemas, filters and serializers), e.g. before forking
+        workers. Returns the seconds each resource took, by name.
+
+        :param app: the application to use outside an application context,
+            defaults to the one given to the constructor
+        """
+        if not has_app_context():
+            with (app or self.app).app_context():
+                return self.warmup()
+
+        timings = {}
+
+        for name, resource in sorted(self.resources.items()):
+            manager = getattr(resource, 'manager', None)
+            if manager is None:
+                continue
+
+            start = time.time()
+            manager.build()
+            manager.get_serializer()
+            timings[name] = time.time() - start
+
+        logger.info("Warmed up %d resources in %.1f ms",
+                    len(timings), sum(timings.values()) * 1000)
+        return timings
+
+    def _register_view(self, app, rule, view_func, endpoint, methods, relation,
+                       resource=None):
+        view_func = self.output(view_func, resource)
+        self.endpoints.add(endpoint)
         app.add_url_rule(rule,
                          view_func=view_func,
                          endpoint=endpoint,
                          methods=methods)
 
-    def output(self, view):
+    def output(self, view, resource=None):
+        if inspect.iscoroutinefunction(view):
+            from .aio import async_output
+            return async_output(self, view, resource)
+
         @wraps(view)
         def wrapper(*args, **kwargs):
-            resp = view(*args, **kwargs)
+            try:
+                resp = view(*args, **kwargs)
+            except TonicException as e:
+                return e.get_response()
 
-            if isinstance(resp, BaseResponse):
-                return resp
+            return self._conditional_response(self._make_view_response(resp))
 
-            data, code, headers = unpack(resp)
-            return _make_response(data, code, headers)
+        return wrapper
+
+    def cached(self, view, resource, private=False):
+        """
+        Serves ``view`` from the response cache when ``resource`` enables it.
+
+        :param private: responses depend on the request credentials, which
+            then take part in the cache key
+        """
+        if not self._is_cached(resource):
+            return view
+
+        if inspect.iscoroutinefunction(view):
+            from .aio import async_cached
+            return async_cached(self, view, resource, private)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache_key, resp = self._lookup_response(resource, private)
+
+            if resp is None:
+                resp = self._store_response(view(*args, **kwargs), cache_key, resource)
+            return resp
 
         return wrapper
 
+    @staticmethod
+    def _is_cached(resource):
+        return resource is not None and resource.meta.get('cache', False)
+
+    def _lookup_response(self, resource, private=False):
+        # a cached response may have been read from a lagging replica
+        if request.method not in ('GET', 'HEAD') or reads_own_writes():
+            return None, None
+
+        cache_key = self._cache_key(resource, private)
+        return cache_key, self._cached_response(cache_key)
+
+    @staticmethod
+    def _make_view_response(resp):
+        if not isinstance(resp, BaseResponse):
+            data, code, headers = unpack(resp)
+            resp = _make_response(data, code, headers)
+        return resp
+
+    def _store_response(self, resp, cache_key, resource):
+        resp = self._make_view_response(resp)
+
+        # nothing read inside a batch transaction is committed yet
+        if cache_key is not None and resp.status_code == 200 and not resp.is_streamed \
+                and g.get('tonic_transaction') is None:
+            self._cache_response(cache_key, resp, resource)
+        return resp
+
+    @staticmethod
+    def _conditional_response(resp):
+        # a HEAD response built without a body has no tag to compare
+        if request.method == 'HEAD' and not resp.content_length:
+            return resp
+
+        if request.method in ('GET', 'HEAD') and resp.status_code == 200 \
+                and not resp.is_streamed:
+            if 'ETag' not in resp.headers:
+                resp.add_etag()
+            resp.make_conditional(request)
+        return resp
+
+    def _cache_key(self, resource, private=False):
+        key = 'tonic:{}:{}:{}:{}:{}'.format(
+            request.method,
+            request.endpoint,
+            self.generation(resource),
+            url_encode(sorted(request.view_args.items())),
+            url_encode(sorted(request.args.items(multi=True))))
+
+        if private:
+            credentials = '\n'.join(request.headers.get(name, '')
+                                    for name in CREDENTIAL_HEADERS)
+            key += ':' + hashlib.sha1(credentials.encode('utf-8')).hexdigest()
+        return key
+
+    @staticmethod
+    def _generation_key(resource):
+        return 'tonic:{}:generation'.format(resource.meta.name)
+
+    def _cached_response(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        data, status, headers = entry
+        return current_app.response_class(data, status=status, headers=headers)
+
+    def _cache_response(self, key, resp, resource):
+        headers = [(name, value) for name, value in resp.headers
+                   if name != 'Content-Length']
+        entry = (resp.get_data(), resp.status_code, headers)
+        self.cache.set(key, entry, resource.meta.get('cache_timeout', None))
+
+    def generation(self, resource):
+        """
+        Returns the current key generation of ``resource``; keys built with
+        it are abandoned on the next write.
+        """
+        generation = self.cache.get(self._generation_key(resource))
+        if generation is None:
+            generation = self.invalidate(resource)
+        return generation
+
+    def invalidate(self, resource):
+        """
+        Discards every cached response of ``resource``. Entries are not
+        removed one by one; the resource moves on to a new key generation
+        and the old entries age out of the backend.
+        """
+        generation = uuid.uuid4().hex
+        if self.cache is not None:
+            self.cache.set(self._generation_key(resource), generation, timeout=0)
+        return generation
+
+    def encoded_schema(self, key, build):
+        """
+        Returns a response for the schema returned by ``build()``. The schema
+        is built and encoded on first use only and served from bytes after
+        that, until a resource is registered.
+        """
+        entry = self._encoded_schemas.get(key)
+
+        if entry is None:
+            resp = _make_response(build(), 200, pretty=False)
+            resp.add_etag()
+            entry = self._encoded_schemas[key] = (resp.get_data(), resp.headers['ETag'])
+
+        data, etag = entry
+        return current_app.response_class(data, mimetype='application/json',
+                                          headers={'ETag': etag})
+
+    @staticmethod
+    def _remove_read_sessions(exc):
+        for session in current_app.extensions.get('tonic_read_sessions', {}).values():
+            session.remove()
+
+    def _start_metrics(self):
+        if request.endpoint in self.endpoints and request.endpoint != '_metrics':
+            self.metrics.start()
+
+    def _finish_metrics(self, response):
+        if request.endpoint in self.endpoints:
+            self.metrics.finish(request.endpoint, response)
+        return response
+
+    def _metrics_view(self):
+        caches = {name: resource.manager.identity_cache
+                  for name, resource in self.resources.items()
+                  if getattr(resource.manager, 'identity_cache', None) is not None}
+        return current_app.response_class(self.metrics.render(caches),
+                                          content_type=Metrics.content_type)
+
+    def _batch_view(self):
+        """
+        Runs a list of ``{method, path, body, headers}`` requests through the
+        registered views and returns their ``{status, headers, body}`` in
+        order. With ``?atomic=true`` every write shares one transaction,
+        committed when all of them succeed; the first error stops the batch
+        and rolls everything back.
+        """
+        entries = request.get_json(silent=True)
+
+        if not isinstance(entries, list) or not all(
+                isinstance(entry, dict) and isinstance(entry.get('path'), six.string_types)
+                for entry in entries):
+            raise InvalidRequest("Expected a list of {method, path, body} objects")
+
+        max_size = current_app.config['TONIC_MAX_BATCH_SIZE']
+        if len(entries) > max_size:
+            raise InvalidRequest("Too many requests in batch", max_size=max_size)
+
+        atomic = request.args.get('atomic', '').lower() in ('1', 'true')
+        # headers of the batch request (credentials, ...) apply to every entry
+        headers = [(name, value) for name, value in request.headers
+                   if name not in ('Content-Type', 'Content-Length')]
+        base_url = request.host_url
+
+        responses = []
+        pending = g.tonic_transaction = [] if atomic else None
+        failed = False
+
+        try:
+            for entry in entries:
+                responses.append(self._batch_dispatch(entry, headers, base_url))
+                if atomic and responses[-1]['status'] >= 400:
+                    failed = True
+                    break
+        except Exception:
+            failed = True
+            raise
+        finally:
+            g.pop('tonic_transaction', None)
+            for session in pending or ():
+                if failed:
+                    session.rollback()
+                else:
+                    session.commit()
+
+        return _make_response(responses, 200)
+
+    def _batch_dispatch(self, entry, headers, base_url):
+        headers = headers + list((entry.get('headers') or {}).items())
+        ctx = current_app.test_request_context(entry['path'],
+                                               base_url=base_url,
+                                               method=entry.get('method', 'GET').upper(),
+                                               headers=headers,
+                                               json=entry.get('body'))
+
+        with ctx:
+            try:
+                if request.routing_exception is not None:
+                    raise request.routing_exception
+                if request.endpoint not in self.endpoints or request.endpoint == '_batch':
+                    raise NotFound()
+                # the same hooks as a direct request: before_request guards,
+                # url value preprocessors, error handlers and after_request
+                resp = current_app.full_dispatch_request()
+            except HTTPException as e:
+                resp = e.get_response()
+
+            data = resp.get_data(as_text=True)
+            if data and resp.mimetype == 'application/json':
+                data = json.loads(data)
+
+            return {
+                'status': resp.status_code,
+                'headers': dict((name, value) for name, value in resp.headers
+                                if name != 'Content-Length'),
+                'body': data or None,
+            }
+
     def _schema_view(self):
+        return self.encoded_schema(None, self._schema)
+
+    def _schema(self):
         schema = OrderedDict()
         schema["$schema"] = "http://json-schema.org/draft-04/hyper-schema#"
 
@@ -165,4 +531,4 @@ class Api(object):
             resource_schema_rule = resource.routes['describedBy'].rule_factory(resource)
             properties[name] = {"$ref": '{}#'.format(resource_schema_rule)}
 
-        return schema, 200
+        return schema
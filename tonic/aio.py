@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Coroutine support. Routes whose function is defined with ``async def`` get
+an ``async`` Flask view, which Flask 2 runs on its own event loop and ASGI
+adapters await directly; everything else about the request (argument
+parsing, formatting, caching, entity tags) is shared with the sync path.
+
+Requires Python 3.5+ and, for :class:`AsyncModelResource`, SQLAlchemy 1.4+.
+"""
+
+from functools import wraps
+
+from flask import request, Response
+from werkzeug.http import quote_etag
+
+from .exceptions import TonicException, InvalidRequest
+from .resource import ModelResource
+from .routes import Route
+from .sqla_async_manager import AsyncSQLAlchemyManager
+
+
+def async_view(route, name, resource):
+    """Async counterpart of :meth:`Route.view_factory`"""
+    view_func = route.view_func
+    parse = route._args_parser(name, resource)
+    format = route._formatter(resource)
+
+    async def view(*args, **kwargs):
+        if parse is not None:
+            args = parse(args)
+        response = await view_func(resource(), *args, **kwargs)
+        return response if format is None else format(response)
+
+    return view
+
+
+def async_output(api, view, resource=None):
+    """Async counterpart of :meth:`Api.output`"""
+
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        try:
+            resp = await view(*args, **kwargs)
+        except TonicException as e:
+            return e.get_response()
+
+        return api._conditional_response(api._make_view_response(resp))
+
+    return wrapper
+
+
+def async_cached(api, view, resource, private=False):
+    """Async counterpart of :meth:`Api.cached`"""
+
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        cache_key, resp = api._lookup_response(resource, private)
+
+        if resp is None:
+            resp = api._store_response(await view(*args, **kwargs), cache_key, resource)
+        return resp
+
+    return wrapper
+
+
+class AsyncModelResource(ModelResource):
+    """
+    A :class:`ModelResource` served by :class:`AsyncSQLAlchemyManager`,
+    with the same routes as coroutines. ``?stream=true``, exports and
+    relation routes are not supported.
+    """
+
+    @Route.GET('', rel="instances", format_response=False)
+    async def instances(self, **kwargs):
+        args = self._instances_args()
+        total = await self.manager.count(args['where']) if args.pop('count') else None
+
+        if request.method == 'HEAD':
+            return Response(headers=self._count_headers(total), mimetype='application/json')
+
+        if args.pop('stream'):
+            raise InvalidRequest("Streaming is not supported by this resource")
+
+        pagination = await self.manager.paginated_instances(**args)
+        return self._page_response(pagination, args['fields'], args['embed'], total)
+
+    instances.request_schema = instances.response_schema = 'collection'
+
+    @instances.POST(rel="create")
+    async def create(self, properties):
+        if isinstance(properties, list):
+            return self._create_many_response(await self.manager.create_many(properties))
+
+        item = await self.manager.create(properties)
+        return self.manager.format_response(item)
+
+    @instances.PATCH(rel="updateMany")
+    async def update_many(self, properties=None):
+        where, ids = self._bulk_filter()
+        count = await self.manager.update_where(properties or {}, where=where, ids=ids)
+        return {'affected': count}
+
+    @update_many.DELETE(rel="destroyMany")
+    async def destroy_many(self):
+        where, ids = self._bulk_filter()
+        return {'affected': await self.manager.delete_where(where=where, ids=ids)}
+
+    @Route.GET('/export', rel="export", format_response=False)
+    async def export(self):
+        raise InvalidRequest("Exporting is not supported by this resource")
+
+    @Route.GET('/<int:id>', rel="self", attribute="instance", format_response=False)
+    async def read(self, id, **kwargs):
+        fields, embed = self._read_args()
+
+        if embed:
+            item = await self.manager.read(id, fields, embed)
+            return self.manager.format_response(item, fields, embed)
+
+        if self.meta.get('identity_cache', False):
+            data, etag = await self.manager.read_formatted(id, fields)
+            if etag in request.if_none_match:
+                return self._not_modified(etag)
+            return data, 200, {'ETag': quote_etag(etag)}
+
+        etag = await self.manager.version_etag(id, fields)
+        if etag is not None and etag in request.if_none_match:
+            return self._not_modified(etag)
+
+        item = await self.manager.read(id, fields)
+        return self._item_response(item, fields, etag)
+
+    @read.PATCH(rel="update")
+    async def update(self, properties, id):
+        if not request.if_match:
+            return self._item_response(await self.manager.update_by_id(id, properties))
+
+        item = await self.manager.read(id)
+        self._check_precondition(item)
+        updated_item = await self.manager.update(item, properties)
+        return self._item_response(updated_item)
+
+    @update.DELETE(rel="destroy", format_response=False)
+    async def destroy(self, id):
+        if not request.if_match:
+            await self.manager.delete_by_id(id)
+            return Response(status=204)
+
+        item = await self.manager.read(id)
+        self._check_precondition(item)
+        await self.manager.delete(item)
+        return Response(status=204)
+
+    class Meta:
+        manager = AsyncSQLAlchemyManager
+        # relation routes are not available on async resources yet
+        relations = False
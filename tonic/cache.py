@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class Cache(object):
+    """
+    Interface of the cache backends used by :class:`tonic.Api`.
+
+    Keys are strings; values are whatever the caller stores. A backend may
+    drop any entry at any time.
+    """
+
+    def get(self, key):
+        """Returns the value stored for ``key``, or ``None``"""
+        raise NotImplementedError()
+
+    def set(self, key, value, timeout=None):
+        """
+        Stores ``value`` for ``key`` for ``timeout`` seconds; ``None`` uses
+        the backend default and ``0`` means the entry does not expire.
+        """
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+
+class LRUCache(Cache):
+    """
+    A bounded in-process cache, evicting the least recently used entry when
+    full and entries older than their timeout on access.
+
+    :param int max_size: maximum number of entries
+    :param timeout: default lifetime of entries in seconds, ``None`` for no limit
+    """
+
+    def __init__(self, max_size=1024, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            # mark as most recently used
+            del self._entries[key]
+            self._entries[key] = (expires, value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        if timeout is None:
+            timeout = self.timeout
+        expires = time.time() + timeout if timeout else None
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
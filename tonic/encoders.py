@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import decimal
+import uuid
+
+from flask import json
+
+
+def json_default(obj):
+    """
+    Encodes the types JSON has no notation for. Shared by every backend so
+    responses look the same whichever one is installed.
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    elif isinstance(obj, decimal.Decimal):
+        # keep the exact value, floats would round it
+        return str(obj)
+    elif isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError("Object of type '{}' is not JSON serializable"
+                    .format(type(obj).__name__))
+
+
+def _orjson_encoder():
+    import orjson
+
+    pretty_options = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+
+    def dumps(data, pretty=False):
+        return orjson.dumps(data, default=json_default,
+                            option=pretty_options if pretty else 0)
+    return dumps
+
+
+def _ujson_encoder():
+    # note: ujson encodes Decimal itself, as a number
+    import ujson
+
+    def dumps(data, pretty=False):
+        if pretty:
+            data = ujson.dumps(data, default=json_default, indent=4, sort_keys=True,
+                               escape_forward_slashes=False)
+        else:
+            data = ujson.dumps(data, default=json_default, escape_forward_slashes=False)
+        return data.encode('utf-8')
+    return dumps
+
+
+def _json_encoder():
+    def dumps(data, pretty=False):
+        if pretty:
+            data = json.dumps(data, default=json_default, indent=4, sort_keys=True)
+        else:
+            data = json.dumps(data, default=json_default)
+        return data.encode('utf-8')
+    return dumps
+
+
+ENCODERS = {
+    'orjson': _orjson_encoder,
+    'ujson': _ujson_encoder,
+    'json': _json_encoder,
+}
+
+_encoders = {}
+
+
+def get_encoder(name='auto'):
+    """
+    Returns a ``dumps(data, pretty=False)`` function returning ``bytes``.
+
+    :param name: one of ``ENCODERS``, or ``'auto'`` for the fastest one
+        installed, falling back to the standard library
+    """
+    try:
+        return _encoders[name]
+    except KeyError:
+        pass
+
+    if name == 'auto':
+        for candidate in ('orjson', 'ujson'):
+            try:
+                encoder = ENCODERS[candidate]()
+                break
+            except ImportError:
+                pass
+        else:
+            encoder = ENCODERS['json']()
+    else:
+        encoder = ENCODERS[name]()
+
+    _encoders[name] = encoder
+    return encoder
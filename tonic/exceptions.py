@@ -1,5 +1,6 @@
 from flask import jsonify
-from werkzeug.exceptions import Conflict, NotFound, InternalServerError
+from werkzeug.exceptions import BadRequest, Conflict, NotFound, InternalServerError, \
+    PreconditionFailed as _PreconditionFailed
 from werkzeug.http import HTTP_STATUS_CODES
 
 class TonicException(Exception):
@@ -42,6 +43,27 @@ class ItemNotFound(TonicException):
         return dct
 
 
+class InvalidRequest(TonicException):
+    werkzeug_exception = BadRequest
+
+    def __init__(self, message=None, **kwargs):
+        super(InvalidRequest, self).__init__(message)
+        self.message = message
+        self.data = kwargs
+
+    def as_dict(self):
+        dct = super(InvalidRequest, self).as_dict()
+
+        if self.message:
+            dct['message'] = self.message
+        dct.update(self.data)
+        return dct
+
+
+class PreconditionFailed(TonicException):
+    werkzeug_exception = _PreconditionFailed
+
+
 class DuplicateKey(TonicException):
     werkzeug_exception = Conflict
 
@@ -59,3 +81,12 @@ class BackendConflict(TonicException):
         dct = super(BackendConflict, self).as_dict()
         dct.update(self.data)
         return dct
+
+
+class VersionConflict(BackendConflict):
+    """The item was changed since the version the client based its update on"""
+
+    def as_dict(self):
+        dct = super(VersionConflict, self).as_dict()
+        dct['message'] = 'Version conflict'
+        return dct
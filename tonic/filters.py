@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+from marshmallow import fields, ValidationError
+
+from .exceptions import InvalidRequest
+
+
+#: A parsed ``where`` entry: ``filter.expression(value)`` gives the clause.
+Condition = namedtuple('Condition', ('attribute', 'filter', 'value'))
+
+
+class BaseFilter(object):
+    """
+    A filter operator bound to one column.
+
+    :param str attribute: name of the filtered field
+    :param column: backend column expression the operator is applied to
+    :param field: marshmallow field used to deserialize values
+    """
+    name = None
+
+    def __init__(self, attribute, column, field):
+        self.attribute = attribute
+        self.column = column
+        self.field = field
+
+    def convert(self, value):
+        try:
+            return self.field.deserialize(value)
+        except ValidationError as e:
+            raise InvalidRequest("Invalid filter value",
+                                 field=self.attribute,
+                                 errors=e.messages)
+
+    def expression(self, value):
+        raise NotImplementedError()
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.attribute)
+
+
+class EqualFilter(BaseFilter):
+    name = 'eq'
+
+    def expression(self, value):
+        return self.column == value
+
+
+class NotEqualFilter(BaseFilter):
+    name = 'ne'
+
+    def expression(self, value):
+        return self.column != value
+
+
+class LessThanFilter(BaseFilter):
+    name = 'lt'
+
+    def expression(self, value):
+        return self.column < value
+
+
+class GreaterThanFilter(BaseFilter):
+    name = 'gt'
+
+    def expression(self, value):
+        return self.column > value
+
+
+class InFilter(BaseFilter):
+    name = 'in'
+
+    def convert(self, value):
+        if not isinstance(value, list):
+            raise InvalidRequest("Invalid filter value", field=self.attribute,
+                                 errors=["Not a valid list."])
+        return [super(InFilter, self).convert(v) for v in value]
+
+    def expression(self, value):
+        return self.column.in_(value)
+
+
+class StartsWithFilter(BaseFilter):
+    name = 'startswith'
+
+    def expression(self, value):
+        return self.column.startswith(value, autoescape=True)
+
+
+class ContainsFilter(BaseFilter):
+    name = 'contains'
+
+    def expression(self, value):
+        return self.column.contains(value, autoescape=True)
+
+
+class NullFilter(BaseFilter):
+    name = 'null'
+
+    def convert(self, value):
+        if not isinstance(value, bool):
+            raise InvalidRequest("Invalid filter value", field=self.attribute,
+                                 errors=["Not a valid boolean."])
+        return value
+
+    def expression(self, value):
+        return self.column.is_(None) if value else self.column.isnot(None)
+
+
+COMPARABLE_FILTERS = (EqualFilter, NotEqualFilter, LessThanFilter,
+                      GreaterThanFilter, InFilter, NullFilter)
+
+TEXT_FILTERS = COMPARABLE_FILTERS + (StartsWithFilter, ContainsFilter)
+
+BOOLEAN_FILTERS = (EqualFilter, NotEqualFilter, NullFilter)
+
+
+def filters_for_field(field):
+    """Returns the default filter classes for a marshmallow field"""
+    if isinstance(field, fields.String):
+        return TEXT_FILTERS
+    elif isinstance(field, fields.Boolean):
+        return BOOLEAN_FILTERS
+    elif isinstance(field, (fields.Number, fields.DateTime, fields.Date, fields.Time)):
+        return COMPARABLE_FILTERS
+    return (EqualFilter, NotEqualFilter, NullFilter)
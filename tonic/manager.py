@@ -1,21 +1,101 @@
 # -*- coding: utf-8 -*-
 
+import csv
+import hashlib
+import threading
+from itertools import islice
+
+import six
+from flask import current_app, json, g
 from marshmallow.utils import is_collection
 from webargs.flaskparser import parser
 
+from .cache import LRUCache
+from .exceptions import ItemNotFound, InvalidRequest
+from .encoders import get_encoder
+from .filters import Condition, filters_for_field
+from .utils import reads_own_writes
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _relates_to(resource, targets):
+    manager = getattr(resource, 'manager', None)
+    return manager is not None and any(
+        manager.relation_resource(attribute) in targets
+        for attribute in manager.relation_attributes())
+
+
+class built_on_first_use(object):
+    """
+    An attribute of a :class:`Manager` set by :meth:`Manager.build`, which
+    runs the first time one of them is read. Reads wait for the build to
+    finish, other threads never see a partly built manager.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.key = '_built_' + name
+
+    def __get__(self, manager, owner):
+        if manager is None:
+            return self
+
+        if not manager._built:
+            manager.build()
+        try:
+            return manager.__dict__[self.key]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, manager, value):
+        manager.__dict__[self.key] = value
+
+
 class Manager(object):
 
+    schema_class = built_on_first_use('schema_class')
+    filters = built_on_first_use('filters')
+
     def __init__(self, resource, model):
         self.resource = resource
-        self.filters = {}
-        self.schema_class = None
+        self.identity_cache = None
+        self._dependents = None
+        self._built = False
+        self._building = False
+        self._build_lock = threading.RLock()
 
         # attach manager to the resource
         resource.manager = self
 
         self._init_model(resource, model, resource.meta)
-        self._init_schema(resource, model, resource.meta)
-        self._init_filters(resource, resource.meta)
+
+    def build(self):
+        """
+        Builds the schema and filters of the resource. They are only needed
+        to serve requests, so this runs on first use or from
+        :meth:`tonic.Api.warmup`, not when the resource is registered.
+        """
+        with self._build_lock:
+            # the building thread reads what it has built so far
+            if self._built or self._building:
+                return
+
+            self._building = True
+            try:
+                self.schema_class = None
+                self.filters = {}
+                self._init_schema(self.resource, self.model, self.resource.meta)
+                self._init_filters(self.resource, self.resource.meta)
+                self._built = True
+            finally:
+                self._building = False
 
     def _init_model(self, resource, model, meta):
         self.model = model
@@ -24,17 +104,79 @@ class Manager(object):
         pass
 
     def _init_filters(self, resource, meta):
-        # FIXME: Implement this
+        """
+        Builds ``self.filters``, a mapping of field name to a mapping of
+        operator name to filter, as allowed by ``Meta.filters``:
+
+        - ``True`` allows every operator on every column,
+        - a list of field names allows every operator on those fields,
+        - a dict maps field names to ``True`` or a list of operator names.
+        """
         self.filters = {}
+        allowed = meta.get('filters', True)
+
+        if not allowed:
+            return
+
+        for attribute, column, field in self._filter_columns():
+            operators = None
+
+            if isinstance(allowed, dict):
+                operators = allowed.get(attribute)
+                if not operators:
+                    continue
+                if operators is True:
+                    operators = None
+            elif allowed is not True and attribute not in allowed:
+                continue
+
+            self.filters[attribute] = {
+                filter_class.name: filter_class(attribute, column, field)
+                for filter_class in filters_for_field(field)
+                if operators is None or filter_class.name in operators
+            }
+
+    def _filter_columns(self):
+        """
+        Returns ``(attribute, column, field)`` for every filterable column.
+        """
+        return ()
 
     # Override by implementors
 
     @property
     def schema(self):
-        return self.schema_class()
+        return self.get_schema()
+
+    def get_schema(self, strict=False, only=None, partial=False):
+        return self.schema_class(strict=strict, only=only, partial=partial)
+
+    def get_serializer(self, only=None):
+        """
+        Returns a function serializing a single item to a ``dict``.
+        """
+        schema = self.get_schema(only=only)
+        return lambda item: schema.dump(item).data
+
+    def relation_attributes(self):
+        """
+        Returns the names of the attributes relating items to other items.
+        """
+        return ()
+
+    def relation_resource(self, attribute):
+        """
+        Returns the registered resource of the items related through
+        ``attribute``, or ``None``.
+        """
+        return None
 
     def relation_instances(self, item, attribute, target_resource,
-                           page=None, per_page=None):
+                           page=None, per_page=None, cursor=None):
+        """
+        Returns a page of the items related to ``item`` through
+        ``attribute``, as instances of ``target_resource``.
+        """
         raise NotImplementedError()
 
     def relation_add(self, item, attribute, target_resource, target_item):
@@ -43,12 +185,143 @@ class Manager(object):
     def relation_remove(self, item, attribute, target_resource, target_item):
         raise NotImplementedError()
 
-    def paginated_instances(self, page, per_page, where=None, sort=None):
+    def paginated_instances(self, page=None, per_page=None, where=None,
+                            sort=None, cursor=None, fields=None, embed=None):
         pass
 
-    def instances(self, where=None, sort=None):
+    def instances(self, where=None, sort=None, fields=None, embed=None):
         pass
 
+    def stream_instances(self, where=None, sort=None, fields=None, embed=None):
+        raise NotImplementedError()
+
+    def export_rows(self, where=None, sort=None, fields=None):
+        """
+        Returns the names of the exported fields and an iterator over
+        tuples of their serialized values, one per item.
+        """
+        raise NotImplementedError()
+
+    def count(self, where=None):
+        """
+        Returns the number of items matching ``where``, memoized until the
+        next write on the resource.
+        """
+        key = self._count_key(where)
+        count = self._cached_count(key)
+
+        if count is None:
+            count = self._count(where)
+            self._cache_count(key, count)
+        return count
+
+    def _count(self, where=None):
+        raise NotImplementedError()
+
+    def _count_key(self, where=None):
+        api = self.resource.api
+        if api is None or api.cache is None or not self.resource.meta.get('count_cache', True):
+            return None
+
+        conditions = [(c.attribute, c.filter.name, c.value) for c in where or ()]
+        return 'tonic:{}:{}:count:{}'.format(self.resource.meta.name,
+                                             api.generation(self.resource),
+                                             self._digest(conditions))
+
+    def _cached_count(self, key):
+        if key is None:
+            return None
+        return self.resource.api.cache.get(key)
+
+    def _cache_count(self, key, count):
+        # nothing read inside a batch transaction is committed yet
+        if key is not None and g.get('tonic_transaction') is None:
+            timeout = current_app.config['TONIC_COUNT_TIMEOUT']
+            self.resource.api.cache.set(key, count, timeout)
+
+    def parse_sort(self, fields):
+        raise NotImplementedError()
+
+    def parse_where(self, where):
+        """
+        Returns a list of conditions for a ``where`` JSON object such as
+        ``{"name": {"$startswith": "Ba"}, "id": {"$in": [1, 2]}}``; a bare
+        value is a shortcut for ``$eq``.
+        """
+        if not where:
+            return None
+
+        if not isinstance(where, dict):
+            try:
+                where = json.loads(where)
+            except ValueError:
+                raise InvalidRequest("Invalid where")
+
+            if not isinstance(where, dict):
+                raise InvalidRequest("Invalid where")
+
+        conditions = []
+        for attribute, value in sorted(where.items()):
+            filters = self.filters.get(attribute)
+            if filters is None:
+                raise InvalidRequest("Unknown filter field", field=attribute)
+
+            if isinstance(value, dict) and value and \
+                    all(key.startswith('$') for key in value):
+                operations = sorted(value.items())
+            else:
+                operations = [('$eq', value)]
+
+            for operator, argument in operations:
+                filter = filters.get(operator[1:])
+                if filter is None:
+                    raise InvalidRequest("Unknown filter operator",
+                                         field=attribute, operator=operator)
+                conditions.append(Condition(attribute, filter, filter.convert(argument)))
+
+        return conditions
+
+    def parse_fields(self, fields):
+        """
+        Returns the requested field names as a tuple, or ``None`` when all
+        fields are wanted.
+        """
+        if not fields:
+            return None
+
+        known = self.schema.fields
+        for field in fields:
+            if field not in known:
+                raise InvalidRequest("Unknown field", field=field)
+
+        return tuple(fields)
+
+    def parse_embed(self, embed):
+        """
+        Returns a tree of relationships to embed, such as
+        ``{"branches": {"bank": {}}}`` for ``["branches", "branches.bank"]``,
+        or ``None`` when nothing is to be embedded.
+        """
+        if not embed:
+            return None
+
+        max_depth = current_app.config['TONIC_MAX_EMBED_DEPTH']
+        tree = {}
+
+        for path in embed:
+            attributes = path.split('.')
+            if len(attributes) > max_depth:
+                raise InvalidRequest("Embed depth exceeded", field=path, max_depth=max_depth)
+
+            manager, node = self, tree
+            for attribute in attributes:
+                resource = manager.relation_resource(attribute)
+                if resource is None:
+                    raise InvalidRequest("Unknown embed", field=path)
+                manager, node = resource.manager, node.setdefault(attribute, {})
+
+        return tree
+
     def first(self, where=None, sort=None):
         try:
             return self.instances(where, sort)[0]
@@ -58,24 +331,184 @@ class Manager(object):
     def create(self, properties, commit=True):
         pass
 
-    def read(self, id):
+    def create_many(self, items, commit=True):
+        raise NotImplementedError()
+
+    def read(self, id, fields=None, embed=None):
         pass
 
     def update(self, item, changes, commit=True):
         pass
 
-    def delete(self, item):
+    def delete(self, item, commit=True):
         pass
 
-    def delete_by_id(self, id):
-        return self.delete(self.read(id))
+    def update_by_id(self, id, changes, commit=True):
+        """
+        Updates item ``id`` and returns it. Backends may do it without
+        loading the item first.
+        """
+        return self.update(self.read(id), changes, commit)
+
+    def delete_by_id(self, id, commit=True):
+        return self.delete(self.read(id), commit)
+
+    def update_where(self, changes, where=None, ids=None, commit=True):
+        """
+        Applies ``changes`` to every item matching ``where`` and ``ids``
+        without loading them. Returns the number of affected items.
+        """
+        raise NotImplementedError()
+
+    def delete_where(self, where=None, ids=None, commit=True):
+        """
+        Deletes every item matching ``where`` and ``ids`` without loading
+        them. Returns the number of affected items.
+        """
+        raise NotImplementedError()
 
     def commit(self):
         pass
 
+    def _invalidate(self):
+        """
+        Discards cached responses of the resource after a write, and those of
+        the resources whose items serialize or embed its items.
+        """
+        api = self.resource.api
+        if api is None:
+            return
+
+        api.invalidate(self.resource)
+        for resource in self._dependent_resources(api):
+            api.invalidate(resource)
+            resource.manager._forget()
+
+    def _dependent_resources(self, api):
+        """
+        Returns the registered resources related to this one, directly or
+        through as many relationships as can be embedded in a response.
+        """
+        depth = max(1, current_app.config['TONIC_MAX_EMBED_DEPTH'])
+        key = (len(api.resources), depth)
+
+        if self._dependents is None or self._dependents[0] != key:
+            found = [self.resource]
+            targets = [self.resource]
+            for _ in range(depth):
+                targets = [resource for resource in api.resources.values()
+                           if resource not in found and _relates_to(resource, targets)]
+                found.extend(targets)
+            self._dependents = (key, found[1:])
+
+        return self._dependents[1]
+
+    def read_formatted(self, id, fields=None):
+        """
+        Returns item ``id`` serialized with ``fields`` and its entity tag,
+        through the identity cache when ``Meta.identity_cache`` is set.
+        """
+        entry = self._cached_identity(id)
+
+        if entry is None:
+            entry = self._identity_entry(self.read(id))
+            self._cache_identity(id, entry)
+        return self._formatted_identity(entry, fields)
+
+    def _get_identity_cache(self):
+        """
+        Returns the identity cache of the resource, an :class:`LRUCache` of
+        serialized items by id, or ``None`` when it is not enabled. It is
+        local to the process: writes made elsewhere show after its timeout.
+        """
+        meta = self.resource.meta
+        if self.identity_cache is None and meta.get('identity_cache', False):
+            config = current_app.config
+            self.identity_cache = LRUCache(
+                max_size=meta.get('identity_cache_size') or config['TONIC_IDENTITY_CACHE_SIZE'],
+                timeout=meta.get('identity_cache_timeout') or config['TONIC_IDENTITY_CACHE_TIMEOUT'])
+        return self.identity_cache
+
+    @staticmethod
+    def _identity_cache_usable():
+        # whatever is read after a write of the request (or uncommitted, in
+        # a batch transaction) must come from the database
+        return not (g.get('tonic_read_primary') or g.get('tonic_transaction') is not None
+                    or reads_own_writes())
+
+    def _cached_identity(self, id):
+        cache = self._get_identity_cache()
+        if cache is None or not self._identity_cache_usable():
+            return None
+        return cache.get(str(id))
+
+    def _cache_identity(self, id, entry):
+        cache = self._get_identity_cache()
+        if cache is not None and self._identity_cache_usable():
+            cache.set(str(id), entry)
+
+    def _identity_entry(self, item):
+        return self.format_response(item), self._etag_source(item)
+
+    def _formatted_identity(self, entry, fields=None):
+        data, source = entry
+
+        if fields:
+            # the cached form is keyed by the names fields are dumped to
+            schema_fields = self.schema.fields
+            data = {key: data[key] for key in
+                    (schema_fields[field].dump_to or field for field in fields)}
+        else:
+            data = dict(data)
+
+        # the same tag :meth:`etag` gives for the item
+        return data, self._etag(data if source is None else source, fields)
+
+    def _etag_source(self, item):
+        """What the tag of ``item`` is computed from, ``None`` for its serialized form"""
+        return None
+
+    def _forget(self, id=None):
+        """Drops item ``id``, or every item, from the identity cache"""
+        if self.identity_cache is not None:
+            if id is None:
+                self.identity_cache.clear()
+            else:
+                self.identity_cache.delete(str(id))
+
+    def etag(self, item, fields=None):
+        """
+        Returns a strong entity tag for ``item`` as serialized with
+        ``fields``, computed from a digest of its serialized form.
+        """
+        return self._etag(self.get_serializer(only=fields)(item), fields)
+
+    def version_etag(self, id, fields=None):
+        """
+        Returns the entity tag of item ``id`` without loading or serializing
+        it, or ``None`` when there is no cheaper way than :meth:`etag`.
+        """
+        return None
+
+    @classmethod
+    def _etag(cls, data, fields=None):
+        return cls._digest([data, fields])
+
+    @staticmethod
+    def _digest(data):
+        data = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
     def verify(self, properties, partial=False):
         pass
 
+    @staticmethod
+    def _per_page(per_page=None):
+        config = current_app.config
+        if not per_page:
+            per_page = config['TONIC_DEFAULT_PER_PAGE']
+        return min(per_page, config['TONIC_MAX_PER_PAGE'])
+
     # Experimental api
 
     def parse_request(self, request):
@@ -86,9 +519,82 @@ class Manager(object):
 
         return data
 
-    def format_response(self, response):
-        many = is_collection(response)
-        return self.schema.dump(response, many=many).data
+    def format_response(self, response, fields=None, embed=None):
+        serialize = self._serializer(fields, embed)
+
+        if is_collection(response):
+            return [serialize(item) for item in response]
+        return serialize(response)
+
+    def format_stream(self, items, fields=None, embed=None):
+        """
+        Serializes ``items`` one at a time into chunks of a JSON array, so
+        that no more than a batch of rows is held in memory.
+        """
+        serialize = self._serializer(fields, embed)
+        dumps = get_encoder(current_app.config['TONIC_JSON_ENCODER'])
+        batch_size = current_app.config['TONIC_STREAM_BATCH_SIZE']
+        chunk, separator = [], b''
+
+        yield b'['
+        for item in items:
+            chunk.append(dumps(serialize(item)))
+
+            if len(chunk) >= batch_size:
+                yield separator + b','.join(chunk)
+                separator, chunk = b',', []
+
+        if chunk:
+            yield separator + b','.join(chunk)
+        yield b']'
+
+    def format_ndjson(self, keys, rows):
+        """
+        Encodes rows from :meth:`export_rows` as JSON objects, one per line,
+        ``TONIC_STREAM_BATCH_SIZE`` rows per chunk.
+        """
+        dumps = get_encoder(current_app.config['TONIC_JSON_ENCODER'])
+
+        for batch in _batches(rows, current_app.config['TONIC_STREAM_BATCH_SIZE']):
+            yield b''.join(dumps(dict(zip(keys, row))) + b'\n' for row in batch)
+
+    def format_csv(self, keys, rows):
+        """
+        Encodes rows from :meth:`export_rows` as CSV with a header line,
+        ``TONIC_STREAM_BATCH_SIZE`` rows per chunk.
+        """
+        buffer = six.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(keys)
+
+        for batch in _batches(rows, current_app.config['TONIC_STREAM_BATCH_SIZE']):
+            writer.writerows(batch)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            # no rows, the header alone
+            yield buffer.getvalue().encode('utf-8')
+
+    def _serializer(self, fields=None, embed=None):
+        serialize = self.get_serializer(only=fields)
+
+        if not embed:
+            return serialize
+
+        relations = [(attribute, self.relation_resource(attribute).manager, nested)
+                     for attribute, nested in sorted(embed.items())]
+
+        def serialize_embedded(item):
+            data = serialize(item)
+            for attribute, manager, nested in relations:
+                value = getattr(item, attribute)
+                data[attribute] = None if value is None else \
+                    manager.format_response(value, embed=nested)
+            return data
+
+        return serialize_embedded
 
 
 class RelationalManager(Manager):
@@ -120,9 +626,27 @@ class RelationalManager(Manager):
     def _query_order_by(self, query, sort=None):
         raise NotImplementedError()
 
+    def _query_load_only(self, query, fields, sort=None):
+        raise NotImplementedError()
+
+    def _query_load_relations(self, query, fields=None, embed=None):
+        raise NotImplementedError()
+
     def _query_get_paginated_items(self, query, page, per_page):
         raise NotImplementedError()
 
+    def _query_get_keyset_items(self, query, cursor, per_page, sort=None):
+        raise NotImplementedError()
+
+    def _query_get_stream(self, query):
+        raise NotImplementedError()
+
+    def _query_count(self):
+        raise NotImplementedError()
+
+    def _query_get_count(self, query):
+        raise NotImplementedError()
+
     def _query_get_all(self, query):
         raise NotImplementedError()
 
@@ -132,31 +656,66 @@ class RelationalManager(Manager):
     def _query_get_first(self, query):
         raise NotImplementedError()
 
-    def paginated_instances(self, page, per_page, where=None, sort=None):
-        instances = self.instances(where=where, sort=sort)
-        return self._query_get_paginated_instances(instances, page, per_page)
+    def paginated_instances(self, page=None, per_page=None, where=None,
+                            sort=None, cursor=None, fields=None, embed=None):
+        """
+        Returns a page of instances.
 
-    def instances(self, where=None, sort=None):
-        query = self._query()
+        Pages are selected after ``cursor`` over the sort columns, unless a
+        ``page`` number is given, in which case ``OFFSET`` is used.
+        """
+        per_page = self._per_page(per_page)
+        query = self.instances(where=where, sort=sort, fields=fields, embed=embed)
 
-        if query is None:
-            return []
+        if page is not None:
+            return self._query_get_paginated_items(query, page, per_page)
+        return self._query_get_keyset_items(query, cursor, per_page, sort)
 
+    def _query_where(self, query, where=None, ids=None):
         if where:
             expressions = [self._expression_for_condition(condition) for condition in where]
             query = self._query_filter(query, self._and_expression(expressions))
 
+        if ids is not None:
+            query = self._query_filter(query, self._expression_for_ids(ids))
+
+        return query
+
+    def _count(self, where=None):
+        return self._query_get_count(self._query_where(self._query_count(), where))
+
+    def instances(self, where=None, sort=None, fields=None, embed=None):
+        query = self._query()
+
+        if query is None:
+            return []
+
+        query = self._query_where(query, where)
+
+        if fields:
+            query = self._query_load_only(query, fields, sort)
+
+        query = self._query_load_relations(query, fields, embed)
         return self._query_order_by(query, sort)
 
+    def stream_instances(self, where=None, sort=None, fields=None, embed=None):
+        return self._query_get_stream(self.instances(where=where, sort=sort,
+                                                     fields=fields, embed=embed))
+
     def first(self, where=None, sort=None):
         try:
             return self._query_get_first(self.instances(where, sort))
         except IndexError:
             raise ItemNotFound(self.resource, where=where)
 
-    def read(self, id):
+    def read(self, id, fields=None, embed=None):
         query = self._query()
 
         if query is None:
             raise ItemNotFound(self.resource, id=id)
+
+        if fields:
+            query = self._query_load_only(query, fields)
+
+        query = self._query_load_relations(query, fields, embed)
         return self._query_filter_by_id(query, id)
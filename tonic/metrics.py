@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_app_context
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram(object):
+    """
+    Counts observations in fixed buckets, as a Prometheus histogram.
+
+    :param buckets: sorted upper bounds, ``+Inf`` is implied
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        """Yields ``(le, cumulative count)`` for every bucket"""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield ('+Inf' if bound == float('inf') else repr(bound)), total
+
+
+class Metrics(object):
+    """
+    Per endpoint request metrics: latency, response size, status codes and
+    the SQL statements run while serving the request, rendered in the
+    Prometheus text format.
+
+    Statements are counted through SQLAlchemy engine events, on every
+    engine of the process, when SQLAlchemy is installed.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+        self.query_duration = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self._lock = threading.Lock()
+        _listen_engines()
+
+    def start(self):
+        g.tonic_metrics = [time.time(), 0, 0.0]
+
+    def finish(self, endpoint, response):
+        started, queries, query_duration = g.pop('tonic_metrics', (None, 0, 0.0))
+        if started is None:
+            return
+
+        duration = time.time() - started
+        size = response.content_length
+
+        with self._lock:
+            self.requests[(endpoint, response.status_code)] += 1
+            self.latency[endpoint].observe(duration)
+            if size is not None:
+                self.size[endpoint].observe(size)
+            self.queries[endpoint].observe(queries)
+            self.query_duration[endpoint].observe(query_duration)
+
+    def render(self, identity_caches=None):
+        """
+        Returns the metrics as text, with the counters of the given
+        identity caches, a mapping of resource name to cache.
+        """
+        lines = []
+
+        with self._lock:
+            lines.append('# HELP tonic_requests_total Requests by endpoint and status.')
+            lines.append('# TYPE tonic_requests_total counter')
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append('tonic_requests_total{{endpoint="{}",status="{}"}} {}'
+                             .format(endpoint, status, count))
+
+            for name, help, histograms in (
+                    ('tonic_request_duration_seconds', 'Request latency.', self.latency),
+                    ('tonic_response_size_bytes', 'Response body size.', self.size),
+                    ('tonic_sql_queries', 'SQL statements per request.', self.queries),
+                    ('tonic_sql_duration_seconds', 'SQL time per request.', self.query_duration)):
+                lines.extend(_render_histograms(name, help, histograms))
+
+        for name, type, help, value in (
+                ('tonic_identity_cache_hits_total', 'counter', 'Identity cache hits.',
+                 lambda cache: cache.hits),
+                ('tonic_identity_cache_misses_total', 'counter', 'Identity cache misses.',
+                 lambda cache: cache.misses),
+                ('tonic_identity_cache_entries', 'gauge', 'Items in the identity cache.', len)):
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, type))
+            for resource, cache in sorted((identity_caches or {}).items()):
+                lines.append('{}{{resource="{}"}} {}'.format(name, resource, value(cache)))
+
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def _render_histograms(name, help, histograms):
+    yield '# HELP {} {}'.format(name, help)
+    yield '# TYPE {} histogram'.format(name)
+
+    for endpoint, histogram in sorted(histograms.items()):
+        for le, count in histogram.samples():
+            yield '{}_bucket{{endpoint="{}",le="{}"}} {}'.format(name, endpoint, le, count)
+        yield '{}_sum{{endpoint="{}"}} {!r}'.format(name, endpoint, histogram.sum)
+        yield '{}_count{{endpoint="{}"}} {}'.format(name, endpoint, histogram.count)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('tonic_query_start', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['tonic_query_start'].pop()
+
+    if has_app_context():
+        stats = g.get('tonic_metrics')
+        if stats is not None:
+            stats[1] += 1
+            stats[2] += time.time() - started
+
+
+def _listen_engines():
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+    except ImportError:
+        return
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import binascii
+from collections import OrderedDict
+
+from flask import json
+from werkzeug.urls import url_encode
+
+from .encoders import json_default
+from .exceptions import InvalidRequest
+
+
+def encode_cursor(values):
+    """
+    Return an opaque, url safe cursor for a list of sort key values; values
+    JSON has no notation for are stored as :func:`json_default` encodes them.
+    """
+    data = json.dumps(values, separators=(',', ':'), default=json_default)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return the list of sort key values stored in ``cursor``"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidRequest("Invalid cursor")
+
+    if not isinstance(values, list):
+        raise InvalidRequest("Invalid cursor")
+    return values
+
+
+class BasePagination(object):
+
+    def __init__(self, items, per_page):
+        self.items = items
+        self.per_page = per_page
+
+    @property
+    def links(self):
+        """Return an ordered mapping of link relation to query parameters"""
+        raise NotImplementedError()
+
+    def link_header(self, base_url, args):
+        """
+        Returns a ``Link`` header value for this page.
+
+        :param base_url: url of the collection without query string
+        :param args: current request arguments, ``MultiDict``
+        """
+        links = []
+        for rel, params in self.links.items():
+            link_args = args.copy()
+            link_args['per_page'] = self.per_page
+            for key, value in params.items():
+                link_args.pop(key, None)
+                if value is not None:
+                    link_args[key] = value
+            links.append('<{}?{}>; rel="{}"'.format(base_url, url_encode(link_args), rel))
+        return ', '.join(links)
+
+
+class Pagination(BasePagination):
+    """A page of items selected with ``OFFSET``/``LIMIT``"""
+
+    def __init__(self, items, page, per_page, has_next):
+        super(Pagination, self).__init__(items, per_page)
+        self.page = page
+        self.has_next = has_next
+
+    @property
+    def links(self):
+        links = OrderedDict([('first', {'page': 1})])
+        if self.page > 1:
+            links['prev'] = {'page': self.page - 1}
+        if self.has_next:
+            links['next'] = {'page': self.page + 1}
+        return links
+
+
+class KeysetPagination(BasePagination):
+    """A page of items selected after a cursor over the sort columns"""
+
+    def __init__(self, items, per_page, next_cursor=None):
+        super(KeysetPagination, self).__init__(items, per_page)
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def links(self):
+        links = OrderedDict([('first', {'cursor': None, 'page': None})])
+        if self.has_next:
+            links['next'] = {'cursor': self.next_cursor, 'page': None}
+        return links
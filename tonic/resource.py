@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
 import inspect
+import six
 from operator import attrgetter
 from collections import OrderedDict
+from flask import request, Response, stream_with_context
+from werkzeug.http import quote_etag
 from marshmallow.compat import with_metaclass
+from webargs import fields, validate
 
-from .routes import Route
+from .exceptions import InvalidRequest, PreconditionFailed
+from .routes import Route, RouteSet, attribute_to_route_uri, to_camel_case, parser
 
 
 class AttributeDict(dict):
@@ -30,13 +35,23 @@ class ResourceMeta(type):
     def __new__(cls, name, bases, members):
         new_cls = super(ResourceMeta, cls).__new__(cls, name, bases, members)
         routes = dict(getattr(new_cls, 'routes', {})or {})
+        route_sets = dict(getattr(new_cls, 'route_sets', {}) or {})
         meta = AttributeDict()
 
         for base in bases:
             meta.update(getattr(base, 'meta', {}) or {})
 
-            for n, m in inspect.getmembers(base, lambda m: isinstance(m, Route)):
-                _add_route(routes, m, n)
+            if isinstance(base, ResourceMeta):
+                # collected when the base was created, no need to inspect it again
+                routes.update(base.routes)
+                route_sets.update(base.route_sets)
+                continue
+
+            for n, m in inspect.getmembers(base, lambda m: isinstance(m, (Route, RouteSet))):
+                if isinstance(m, Route):
+                    _add_route(routes, m, n)
+                else:
+                    route_sets[n] = m
 
         if 'Meta' in members:
             opts = members['Meta'].__dict__
@@ -50,13 +65,20 @@ class ResourceMeta(type):
         for n, m in members.items():
             if isinstance(m, Route):
                 _add_route(routes, m, n)
+            elif isinstance(m, RouteSet):
+                route_sets[n] = m
 
             # if isinstance(m, ResourceBound):
             #     m.bind(new_cls)
 
         # TODO: Honor exclude_routes option
 
+        for n, rset in route_sets.items():
+            if rset.attribute is None:
+                rset.attribute = n
+
         new_cls.routes = routes
+        new_cls.route_sets = route_sets
         new_cls.meta = meta
         return new_cls
 
@@ -74,8 +96,11 @@ class Resource(with_metaclass(ResourceMeta, object)):
         exclude_routes = ()
         route_decorators = {}
 
-    @Route.GET('/schema', rel="describedBy", attribute="schema")
+    @Route.GET('/schema', rel="describedBy", attribute="schema", format_response=False)
     def described_by(self):
+        return self.api.encoded_schema(self.meta.name, self._describe)
+
+    def _describe(self):
         schema = OrderedDict([
             ("$schema", "http://json-schema.org/draft-04/hyper-schema#"),
         ])
@@ -93,7 +118,7 @@ class Resource(with_metaclass(ResourceMeta, object)):
 
         schema["links"] = [link.schema_factory(self) for link in sorted(links, key=attrgetter('relation'))]
 
-        return schema, 200
+        return schema
 
 
 class ModelResourceMeta(ResourceMeta):
@@ -125,35 +150,314 @@ class ModelResourceMeta(ResourceMeta):
         return new_cls
 
 
+instances_args = {
+    'page': fields.Int(missing=None, validate=validate.Range(min=1)),
+    'per_page': fields.Int(missing=None, validate=validate.Range(min=1)),
+    'cursor': fields.Str(missing=None),
+    'sort': fields.DelimitedList(fields.Str(), missing=None),
+    'stream': fields.Bool(missing=False),
+    'count': fields.Bool(missing=True),
+    'fields': fields.DelimitedList(fields.Str(), missing=None),
+    'where': fields.Str(missing=None),
+    'embed': fields.DelimitedList(fields.Str(), missing=None),
+}
+
+bulk_args = {
+    'where': fields.Str(missing=None),
+    'ids': fields.DelimitedList(fields.Int(), missing=None),
+}
+
+export_args = {
+    'format': fields.Str(missing='ndjson', validate=validate.OneOf(['ndjson', 'csv'])),
+    'sort': fields.DelimitedList(fields.Str(), missing=None),
+    'fields': fields.DelimitedList(fields.Str(), missing=None),
+    'where': fields.Str(missing=None),
+}
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+read_args = {
+    'fields': fields.DelimitedList(fields.Str(), missing=None),
+    'embed': fields.DelimitedList(fields.Str(), missing=None),
+}
+
+relation_args = {
+    'page': fields.Int(missing=None, validate=validate.Range(min=1)),
+    'per_page': fields.Int(missing=None, validate=validate.Range(min=1)),
+    'cursor': fields.Str(missing=None),
+}
+
+
+class Relation(RouteSet):
+    """
+    Routes for a relationship of a model resource:
+
+    - ``GET /<id>/<attribute>`` lists the related items, paginated,
+    - ``PUT /<id>/<attribute>/<target_id>`` adds an item to the relationship,
+    - ``DELETE /<id>/<attribute>/<target_id>`` removes it.
+
+    :param resource: the related resource, its name, or ``None`` to use the
+        registered resource of the relationship's model
+    :param str attribute: name of the relationship, defaults to the name the
+        route set is assigned to
+    :param str io: ``'r'`` to only list the items, ``'rw'`` to change them too
+    """
+
+    def __init__(self, resource=None, attribute=None, io='r'):
+        self.target = resource
+        self.attribute = attribute
+        self.io = io
+
+    def routes(self):
+        rule = '/<int:id>/{}'.format(attribute_to_route_uri(self.attribute))
+        item_rule = rule + '/<int:target_id>'
+
+        yield Route('GET', self._instances, rule=rule,
+                    rel=to_camel_case(self.attribute), format_response=False)
+
+        if 'w' in self.io:
+            yield Route('PUT', self._add, rule=item_rule, body=False,
+                        rel=to_camel_case('add_' + self.attribute), format_response=False)
+            yield Route('DELETE', self._remove, rule=item_rule,
+                        rel=to_camel_case('remove_' + self.attribute), format_response=False)
+
+    def find_target(self, resource):
+        """
+        Returns the related resource if it is registered with the Api of
+        ``resource``, otherwise ``None``.
+        """
+        target = self.target
+        api = resource.api
+
+        if api is None:
+            return None
+        if target is None:
+            return resource.manager.relation_resource(self.attribute)
+        if isinstance(target, six.string_types):
+            return api.resources.get(target)
+        return target if target in api.resources.values() else None
+
+    def target_resource(self, resource):
+        target = self.find_target(resource)
+        if target is None:
+            raise RuntimeError("No resource registered for '{}.{}'"
+                               .format(resource.meta.name, self.attribute))
+        return target
+
+    def _instances(self, resource, id):
+        args = parser.parse(relation_args, request, locations=('query',))
+        target = self.target_resource(type(resource))
+        item = resource.manager.read(id)
+
+        pagination = resource.manager.relation_instances(item, self.attribute, target, **args)
+        headers = {'Link': pagination.link_header(request.base_url, request.args)}
+        return target.manager.format_response(pagination.items), 200, headers
+
+    def _add(self, resource, id, target_id):
+        target = self.target_resource(type(resource))
+        item = resource.manager.read(id)
+        target_item = target.manager.read(target_id)
+
+        target_item = resource.manager.relation_add(item, self.attribute, target, target_item)
+        return target.manager.format_response(target_item)
+
+    def _remove(self, resource, id, target_id):
+        target = self.target_resource(type(resource))
+        item = resource.manager.read(id)
+        target_item = target.manager.read(target_id)
+
+        resource.manager.relation_remove(item, self.attribute, target, target_item)
+        return Response(status=204)
+
+
 class ModelResource(with_metaclass(ModelResourceMeta, Resource)):
 
     manager = None
 
-    @Route.GET('', rel="instances")
+    @Route.GET('', rel="instances", format_response=False)
     def instances(self, **kwargs):
-        return self.manager.instances(**kwargs)
+        args = self._instances_args()
+        count = args.pop('count')
+
+        if request.method == 'HEAD':
+            # the count alone, no row is loaded
+            total = self.manager.count(args['where']) if count else None
+            return Response(headers=self._count_headers(total), mimetype='application/json')
+
+        if args.pop('stream'):
+            fields, embed = args['fields'], args['embed']
+            items = self.manager.stream_instances(where=args['where'],
+                                                  sort=args['sort'],
+                                                  fields=fields,
+                                                  embed=embed)
+            return Response(stream_with_context(self.manager.format_stream(items, fields, embed)),
+                            mimetype='application/json')
+
+        total = self.manager.count(args['where']) if count else None
+        pagination = self.manager.paginated_instances(**args)
+        return self._page_response(pagination, args['fields'], args['embed'], total)
 
     instances.request_schema = instances.response_schema = 'collection'
 
     @instances.POST(rel="create")
     def create(self, properties):
-        item = self.manager.create(properties)
-        return item
+        if isinstance(properties, list):
+            return self._create_many_response(self.manager.create_many(properties))
 
-    @Route.GET('/<int:id>', rel="self", attribute="instance")
+        item = self.manager.create(properties)
+        return self.manager.format_response(item)
+
+    @instances.PATCH(rel="updateMany")
+    def update_many(self, properties=None):
+        where, ids = self._bulk_filter()
+        count = self.manager.update_where(properties or {}, where=where, ids=ids)
+        return {'affected': count}
+
+    @update_many.DELETE(rel="destroyMany")
+    def destroy_many(self):
+        where, ids = self._bulk_filter()
+        return {'affected': self.manager.delete_where(where=where, ids=ids)}
+
+    @Route.GET('/export', rel="export", format_response=False)
+    def export(self):
+        """Streams every item matching ``where`` as NDJSON or CSV"""
+        format, keys, rows = self._export_rows()
+        return self._export_response(format, keys, rows)
+
+    def _export_rows(self):
+        args = parser.parse(export_args, request, locations=('query',))
+        keys, rows = self.manager.export_rows(where=self.manager.parse_where(args['where']),
+                                              sort=self.manager.parse_sort(args['sort']),
+                                              fields=self.manager.parse_fields(args['fields']))
+        return args['format'], keys, rows
+
+    def _export_response(self, format, keys, rows):
+        if format == 'csv':
+            body = self.manager.format_csv(keys, rows)
+        else:
+            body = self.manager.format_ndjson(keys, rows)
+
+        filename = '{}.{}'.format(self.meta.name, format)
+        return Response(stream_with_context(body),
+                        mimetype=EXPORT_MIMETYPES[format],
+                        headers={'Content-Disposition': 'attachment; filename="{}"'.format(filename)})
+
+    def _instances_args(self):
+        args = parser.parse(instances_args, request, locations=('query',))
+        args['sort'] = self.manager.parse_sort(args['sort'])
+        args['fields'] = self.manager.parse_fields(args['fields'])
+        args['where'] = self.manager.parse_where(args['where'])
+        args['embed'] = self.manager.parse_embed(args['embed'])
+        return args
+
+    def _page_response(self, pagination, fields, embed=None, total=None):
+        headers = self._count_headers(total)
+        headers['Link'] = pagination.link_header(request.base_url, request.args)
+        return self.manager.format_response(pagination.items, fields, embed), 200, headers
+
+    @staticmethod
+    def _count_headers(total):
+        if total is None:
+            return {}
+        return {'X-Total-Count': str(total)}
+
+    @staticmethod
+    def _create_many_response(results):
+        failed = any(result['status'] != 201 for result in results)
+        return results, 207 if failed else 201
+
+    def _bulk_filter(self):
+        args = parser.parse(bulk_args, request, locations=('query',))
+        where = self.manager.parse_where(args['where'])
+
+        if not where and args['ids'] is None:
+            raise InvalidRequest("A where filter or a list of ids is required")
+        return where, args['ids']
+
+    @Route.GET('/<int:id>', rel="self", attribute="instance", format_response=False)
     def read(self, id, **kwargs):
-        print("read({}, {})".format(kwargs, id))
-        return self.manager.read(id)
+        fields, embed = self._read_args()
+
+        if embed:
+            # embedded items change the tag, it is computed from the body
+            item = self.manager.read(id, fields, embed)
+            return self.manager.format_response(item, fields, embed)
+
+        if self.meta.get('identity_cache', False):
+            data, etag = self.manager.read_formatted(id, fields)
+            if etag in request.if_none_match:
+                return self._not_modified(etag)
+            return data, 200, {'ETag': quote_etag(etag)}
+
+        # with a version column the tag is known before loading the item
+        etag = self.manager.version_etag(id, fields)
+        if etag is not None and etag in request.if_none_match:
+            return self._not_modified(etag)
+
+        item = self.manager.read(id, fields)
+        return self._item_response(item, fields, etag)
 
     @read.PATCH(rel="update")
     def update(self, properties, id):
+        if not request.if_match:
+            # nothing to compare, the manager may skip loading the item
+            return self._item_response(self.manager.update_by_id(id, properties))
+
         item = self.manager.read(id)
+        self._check_precondition(item)
         updated_item = self.manager.update(item, properties)
-        return updated_item
+        return self._item_response(updated_item)
 
-    @update.DELETE(rel="destroy")
+    @update.DELETE(rel="destroy", format_response=False)
     def destroy(self, id):
-        return "destroy {}".format(id)
+        if not request.if_match:
+            self.manager.delete_by_id(id)
+            return Response(status=204)
+
+        item = self.manager.read(id)
+        self._check_precondition(item)
+        self.manager.delete(item)
+        return Response(status=204)
+
+    def _read_args(self):
+        args = parser.parse(read_args, request, locations=('query',))
+        return self.manager.parse_fields(args['fields']), self.manager.parse_embed(args['embed'])
+
+    @staticmethod
+    def _not_modified(etag):
+        return Response(status=304, headers={'ETag': quote_etag(etag)})
+
+    def _item_response(self, item, fields=None, etag=None):
+        etag = etag or self.manager.etag(item, fields)
+        return self.manager.format_response(item, fields), 200, {'ETag': quote_etag(etag)}
+
+    def _check_precondition(self, item):
+        if request.if_match and self.manager.etag(item) not in request.if_match:
+            raise PreconditionFailed()
+
+    @classmethod
+    def _relation_route_sets(cls, declared=()):
+        """
+        Returns a :class:`Relation` for every relationship of the model
+        allowed by ``Meta.relations`` that has no route set declared.
+
+        ``Meta.relations`` is ``True`` for every relationship, a list of
+        attributes, or a dict mapping attributes to their ``io``. Relations
+        are read-only unless their ``io`` is ``'rw'``.
+        """
+        allowed = cls.meta.get('relations', True)
+        declared = set(rset.attribute for rset in declared if isinstance(rset, Relation))
+
+        if not allowed or cls.manager is None:
+            return []
+
+        io = allowed if isinstance(allowed, dict) else {}
+        return [Relation(attribute=attribute, io=io.get(attribute, 'r'))
+                for attribute in sorted(getattr(cls.manager, 'relationships', ()))
+                if attribute not in declared and (allowed is True or attribute in allowed)]
 
     class Meta:
         model = None
@@ -163,6 +467,7 @@ class ModelResource(with_metaclass(ModelResourceMeta, Resource)):
         include_id = True
         include_type = False
         filters = True
+        relations = True            # read-only, see _relation_route_sets
 
     class Schema:
         pass
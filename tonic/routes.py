@@ -1,16 +1,33 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import inspect
+import logging
 from types import MethodType
 from collections import OrderedDict
 import re
 
 from flask import request
-from webargs.flaskparser import parser
+from webargs.flaskparser import FlaskParser
+from werkzeug.wrappers import BaseResponse
 
+from .exceptions import InvalidRequest
+from .utils import unpack
+
+logger = logging.getLogger(__name__)
+
+
+def _handle_args_error(error, req, schema, *args):
+    raise InvalidRequest("Invalid arguments", errors=error.messages)
+
+#: Parses request arguments, invalid ones raise :class:`InvalidRequest`
+parser = FlaskParser(error_handler=_handle_args_error)
 
 HTTP_METHODS = ('GET', 'PUT', 'POST', 'PATCH', 'DELETE')
 
+# methods whose request body is passed to the view
+BODY_METHODS = ('PUT', 'POST', 'PATCH')
+
 HTTP_METHOD_VERB_DEFAULTS = {
     'GET': 'read',
     'PUT': 'create',
@@ -20,7 +37,7 @@ HTTP_METHOD_VERB_DEFAULTS = {
 }
 
 def url_rule_to_uri_pattern(rule):
-    return re.sub(r'<(\w+:)?([^>]+)', r'{\2}', rule)
+    return re.sub(r'<(\w+:)?([^>]+)>', r'{\2}', rule)
 
 def attribute_to_route_uri(s):
     return s.replace('_', '-')
@@ -52,7 +69,8 @@ class Route(object):
                  description=None,
                  schema=None,
                  response_schema=None,
-                 format_response=True):
+                 format_response=True,
+                 body=None):
         self.rel = rel
         self.rule = rule
         self.method = method
@@ -63,6 +81,8 @@ class Route(object):
 
         self.view_func = view_func
         self.format_response = format_response
+        # whether the parsed request body is passed to the view
+        self.body = method in BODY_METHODS if body is None else body
 
         self.request_schema = None
         self.response_schema = None
@@ -154,31 +174,83 @@ class Route(object):
         """
         Returns a view function for all links within this route and resource.
 
+        The view only does the work the route needs: the request body is
+        parsed only for methods that take one, and the response is only
+        formatted when ``format_response`` is set.
+
         :param name: Flask view name
         :param tonic.Resource resource:
         """
-        request_schema = self.request_schema
-        response_schema = self.response_schema
         view_func = self.view_func
 
-        def view(*args, **kwargs):
-            print("view ({}, {})".format(args, kwargs))
-            instance = resource()
-            schema = resource.manager.get_schema(strict=request.method in ['POST', 'PATCH'])
-            wargs = parser.parse(schema, request)
-            print("parsed wargs: {}".format(wargs))
-            #kwargs.update(wargs)
-            if wargs:
-                args += (wargs,)
-            print("new args:", args)
-            response = view_func(instance, *args, **kwargs)
-
-            if not self.format_response:
-                return response
-            return resource.manager.format_response(response)
+        if inspect.iscoroutinefunction(view_func):
+            from .aio import async_view
+            return async_view(self, name, resource)
+
+        parse = self._args_parser(name, resource)
+        format = self._formatter(resource)
+
+        if parse is None and format is None:
+            def view(*args, **kwargs):
+                return view_func(resource(), *args, **kwargs)
+        else:
+            def view(*args, **kwargs):
+                if parse is not None:
+                    args = parse(args)
+                response = view_func(resource(), *args, **kwargs)
+                return response if format is None else format(response)
 
         return view
 
+    def _args_parser(self, name, resource):
+        """
+        Returns a function appending the request body to the view arguments,
+        or ``None`` when the route takes no body.
+        """
+        manager = getattr(resource, 'manager', None)
+
+        if not self.body or manager is None:
+            return None
+
+        strict = self.method in ('POST', 'PATCH')
+        partial = self.method == 'PATCH'
+
+        def parse(args):
+            body = request.get_json(silent=True)
+            if isinstance(body, list):
+                # only creation takes many items, validated one by one by the view
+                if self.relation != 'create':
+                    raise InvalidRequest("Expected an object, not a list")
+                wargs = body
+            else:
+                schema = manager.get_schema(strict=strict, partial=partial)
+                wargs = parser.parse(schema, request, locations=('json', 'form'))
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s: parsed %r", name, wargs)
+
+            # an empty body is still passed, e.g. a PATCH changing nothing
+            return args + (wargs,)
+
+        return parse
+
+    def _formatter(self, resource):
+        """
+        Returns a function formatting what the view returns, or ``None``
+        when the route formats its own response or there is no manager.
+        """
+        if not self.format_response or getattr(resource, 'manager', None) is None:
+            return None
+
+        def format(response):
+            if isinstance(response, BaseResponse):
+                return response
+
+            data, code, headers = unpack(response)
+            return resource.manager.format_response(data), code, headers
+
+        return format
+
 
 def _route_decorator(method):
     @classmethod
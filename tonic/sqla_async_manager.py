@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+A :class:`SQLAlchemyManager` running its queries on SQLAlchemy's asyncio
+extension (SQLAlchemy 1.4 or later), for use with
+:class:`tonic.aio.AsyncModelResource`.
+
+Every operation opens its own ``AsyncSession`` on the engine built from
+``TONIC_ASYNC_DATABASE_URI``; items are returned detached and should not
+rely on lazy loaded relationships.
+"""
+
+from flask import current_app
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
+
+from .sqla_manager import SQLAlchemyManager, RowItem
+from .exceptions import ItemNotFound, InvalidRequest, VersionConflict
+from .pagination import Pagination
+
+
+def _get_sessionmaker(app):
+    sessionmaker_ = app.extensions.get('tonic_async_session')
+
+    if sessionmaker_ is None:
+        engine = create_async_engine(app.config['TONIC_ASYNC_DATABASE_URI'],
+                                     **app.config['TONIC_ASYNC_ENGINE_OPTIONS'])
+        sessionmaker_ = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        app.extensions['tonic_async_session'] = sessionmaker_
+
+    return sessionmaker_
+
+
+class AsyncSQLAlchemyManager(SQLAlchemyManager):
+    """
+    Same interface as :class:`SQLAlchemyManager`, with every method that
+    touches the database being a coroutine.
+    """
+
+    def _schema_options(self):
+        # loading only validates data, no session is needed for that
+        return {'transient': True}
+
+    @staticmethod
+    def _get_session():
+        return _get_sessionmaker(current_app._get_current_object())()
+
+    def _query(self):
+        return select(self.model)
+
+    def _query_filter(self, query, expression):
+        return query.where(expression)
+
+    def _query_count(self):
+        return select(func.count()).select_from(self.model)
+
+    async def _query_get_count(self, query):
+        async with self._get_session() as session:
+            return (await session.execute(query)).scalar()
+
+    async def count(self, where=None):
+        key = self._count_key(where)
+        count = self._cached_count(key)
+
+        if count is None:
+            count = await self._count(where)
+            self._cache_count(key, count)
+        return count
+
+    async def _query_filter_by_id(self, query, id):
+        async with self._get_session() as session:
+            item = (await session.execute(query.where(self.id_column == id))).scalar()
+
+        if item is None:
+            raise ItemNotFound(self.resource, id=id)
+        return item
+
+    async def _query_get_paginated_items(self, query, page, per_page):
+        query = query.offset((page - 1) * per_page).limit(per_page + 1)
+
+        async with self._get_session() as session:
+            items = (await session.execute(query)).scalars().all()
+
+        return Pagination(items[:per_page], page, per_page, len(items) > per_page)
+
+    async def _query_get_keyset_items(self, query, cursor, per_page, sort=None):
+        query = self._keyset_query(query, cursor, per_page, sort)
+
+        async with self._get_session() as session:
+            items = (await session.execute(query)).scalars().all()
+
+        return self._keyset_pagination(items, per_page, sort)
+
+    def _query_get_stream(self, query):
+        raise NotImplementedError("Streaming is not supported by the async manager")
+
+    async def read_formatted(self, id, fields=None):
+        entry = self._cached_identity(id)
+
+        if entry is None:
+            entry = self._identity_entry(await self.read(id))
+            self._cache_identity(id, entry)
+        return self._formatted_identity(entry, fields)
+
+    async def version_etag(self, id, fields=None):
+        if self.version_column is None:
+            return None
+
+        query = select(self.version_column).where(self.id_column == id)
+        async with self._get_session() as session:
+            version = (await session.execute(query)).scalar()
+
+        if version is None:
+            raise ItemNotFound(self.resource, id=id)
+        return self._etag([id, version], fields)
+
+    async def _load_related(self, session, properties):
+        """
+        Returns ``properties`` with the transient related items the schema
+        builds from ids replaced by the stored items they refer to.
+        """
+        loaded = dict(properties)
+
+        for key, value in properties.items():
+            prop = self.relationships.get(key)
+            if prop is None or value is None:
+                continue
+
+            if prop.uselist:
+                loaded[key] = [await self._load_related_item(session, prop, v) for v in value]
+            else:
+                loaded[key] = await self._load_related_item(session, prop, value)
+
+        return loaded
+
+    @staticmethod
+    async def _load_related_item(session, prop, item):
+        identity = prop.mapper.primary_key_from_instance(item)
+        related = await session.get(prop.mapper.class_, identity)
+
+        if related is None:
+            raise InvalidRequest("Related item not found", field=prop.key,
+                                 id=identity[0] if len(identity) == 1 else identity)
+        return related
+
+    def _load_relationships(self, session, item):
+        # items leave the session, serialized relationships can't load later
+        for attribute in self.serialized_relationships:
+            getattr(item, attribute)
+
+    async def create(self, properties, commit=True):
+        item = self.model()
+
+        async with self._get_session() as session:
+            for key, value in (await self._load_related(session, properties)).items():
+                setattr(item, key, value)
+
+            try:
+                session.add(item)
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                self._raise_conflict(e)
+
+            await session.run_sync(self._load_relationships, item)
+
+        self._invalidate()
+        return item
+
+    async def create_many(self, items, commit=True):
+        results, valid = self._validate_many(items)
+
+        async with self._get_session() as session:
+            valid = [(index, await self._load_related(session, row)) for index, row in valid]
+
+            for chunk in self._chunks(valid):
+                try:
+                    await session.run_sync(self._insert_chunk, chunk)
+                    await session.commit()
+                except IntegrityError:
+                    await session.rollback()
+                    for index, row in chunk:
+                        results[index] = await session.run_sync(self._create_one, row)
+                    await session.commit()
+                else:
+                    for index, _ in chunk:
+                        results[index] = {'status': 201}
+
+        if valid:
+            self._invalidate()
+        return results
+
+    async def update(self, item, changes, commit=True):
+        actual_changes = self._actual_changes(item, changes)
+
+        if not actual_changes:
+            return item
+
+        async with self._get_session() as session:
+            item = await session.merge(item, load=False)
+
+            try:
+                for key, value in (await self._load_related(session, actual_changes)).items():
+                    setattr(item, key, value)
+                await session.commit()
+            except StaleDataError:
+                await session.rollback()
+                raise VersionConflict(id=getattr(item, self.id_attribute))
+            except IntegrityError as e:
+                await session.rollback()
+                self._raise_conflict(e)
+
+            await session.run_sync(self._load_relationships, item)
+
+        self._invalidate()
+        self._forget(getattr(item, self.id_attribute))
+        return item
+
+    async def delete(self, item, commit=True):
+        async with self._get_session() as session:
+            item = await session.merge(item, load=False)
+
+            try:
+                await session.delete(item)
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget(getattr(item, self.id_attribute))
+
+    async def update_by_id(self, id, changes, commit=True):
+        if not self._writes_without_loading(changes):
+            return await self.update(await self.read(id), changes)
+
+        if not changes:
+            return await self.read(id)
+
+        statement = self._update_statement(id, changes)
+
+        async with self._get_session() as session:
+            returning = self._supports_returning(session.bind.dialect)
+
+            try:
+                if returning:
+                    row = (await session.execute(statement.returning(*self.row_columns))).first()
+                elif (await session.execute(statement)).rowcount:
+                    row = (await session.execute(self._select_row(id))).first()
+                else:
+                    row = None
+
+                if row is None:
+                    # either there is no such item or nothing changed
+                    row = (await session.execute(self._select_row(id))).first()
+                    if row is None:
+                        await session.rollback()
+                        raise ItemNotFound(self.resource, id=id)
+                    return RowItem(zip(self.table_columns, row))
+
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget(id)
+        return RowItem(zip(self.table_columns, row))
+
+    async def delete_by_id(self, id, commit=True):
+        if not self._writes_without_loading():
+            return await self.delete(await self.read(id))
+
+        async with self._get_session() as session:
+            try:
+                if not (await session.execute(self._delete_statement(id))).rowcount:
+                    await session.rollback()
+                    raise ItemNotFound(self.resource, id=id)
+
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget(id)
+
+    async def update_where(self, changes, where=None, ids=None, commit=True):
+        if not changes:
+            raise InvalidRequest("No changes given")
+
+        for key in changes:
+            if key not in self.sortable_attributes:
+                raise InvalidRequest("Only columns can be updated in bulk", field=key)
+
+        query = self._query_where(self._query(), where, ids)
+        statement = update(self.model).values(self._bulk_changes(changes))
+        return await self._execute_bulk(self._bulk_where(statement, query))
+
+    async def delete_where(self, where=None, ids=None, commit=True):
+        query = self._query_where(self._query(), where, ids)
+        return await self._execute_bulk(self._bulk_where(delete(self.model), query))
+
+    @staticmethod
+    def _bulk_where(statement, query):
+        if query.whereclause is not None:
+            statement = statement.where(query.whereclause)
+        return statement.execution_options(synchronize_session=False)
+
+    async def _execute_bulk(self, statement, commit=True):
+        async with self._get_session() as session:
+            try:
+                count = (await session.execute(statement)).rowcount
+                await session.commit()
+            except IntegrityError as e:
+                await session.rollback()
+                self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget()
+        return count
@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 
-from flask import current_app
+from operator import attrgetter
+from flask import current_app, g, has_app_context, has_request_context, request
 from flask_sqlalchemy import get_state
+from marshmallow import Schema, ValidationError, fields
+from marshmallow.utils import ensure_text_type
+from sqlalchemy import and_, or_, func, select, Column, Integer
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import class_mapper
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm import class_mapper, load_only, joinedload, selectinload, with_parent
+from sqlalchemy.orm.interfaces import MANYTOONE
+from sqlalchemy.orm.exc import NoResultFound, StaleDataError
 from marshmallow_sqlalchemy import ModelSchema
-from .manager import RelationalManager
-from .exceptions import ItemNotFound, DuplicateKey, BackendConflict
-from .utils import get_value
+from .cache import LRUCache
+from .manager import RelationalManager, built_on_first_use
+from .exceptions import ItemNotFound, DuplicateKey, BackendConflict, InvalidRequest, \
+    VersionConflict
+from .pagination import Pagination, KeysetPagination, encode_cursor, decode_cursor
+from .utils import get_value, reads_own_writes
+
+#: Schemas and serializers kept per manager, one per set of ``?fields=``
+SCHEMA_CACHE_SIZE = 128
 
 class CustomModelSchema(ModelSchema):
 
@@ -16,17 +27,135 @@ class CustomModelSchema(ModelSchema):
         "Don't return a model, only return dict with data"
         return data
 
+
+def _boolean_converter(field):
+    def convert(value):
+        if value in field.truthy:
+            return True
+        elif value in field.falsy:
+            return False
+        return bool(value)
+    return convert
+
+
+_field_converters = {
+    fields.Integer: lambda field: int,
+    fields.Float: lambda field: float,
+    fields.String: lambda field: ensure_text_type,
+    fields.Boolean: _boolean_converter,
+}
+
+
+def _compile_serializer(schema):
+    """
+    Returns a function that serializes one object exactly as
+    ``schema.dump(obj).data`` does, reading attributes straight from the
+    object and skipping marshmallow's per field machinery. Returns ``None``
+    when the schema uses anything the compiled path does not reproduce.
+    """
+    if schema._has_processors or schema.extra or schema.prefix or \
+            type(schema).get_attribute is not Schema.get_attribute:
+        return None
+
+    getters = []
+    for name, field in schema.fields.items():
+        if field.load_only:
+            continue
+
+        factory = _field_converters.get(type(field))
+        if factory is None or getattr(field, 'as_string', False):
+            return None
+        getters.append((field.dump_to or name,
+                        attrgetter(field.attribute or name),
+                        factory(field)))
+
+    dict_class = schema.dict_class
+
+    def serialize(obj):
+        items = []
+        for key, getter, convert in getters:
+            value = getter(obj)
+            items.append((key, None if value is None else convert(value)))
+        return dict_class(items)
+
+    return serialize
+
+
+class RowItem(object):
+    """An item read from a result row, with the model's attribute names"""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+def _get_read_session(app, bind):
+    """
+    Returns the scoped session reading from the ``bind`` engine, one per
+    bind key; :class:`tonic.Api` removes them when the app context ends.
+    """
+    sessions = app.extensions.setdefault('tonic_read_sessions', {})
+    session = sessions.get(bind)
+
+    if session is None:
+        db = get_state(app).db
+        # no per table binds, every model without a bind key reads from ``bind``
+        session = sessions[bind] = db.create_scoped_session({
+            'bind': db.get_engine(app, bind=bind),
+            'binds': {},
+        })
+    return session
+
+
+def read_your_writes():
+    """
+    Sends the reads of the current request to the primary database, e.g.
+    from a ``before_request`` hook for clients that just wrote.
+    """
+    g.tonic_read_primary = True
+
+
 class SQLAlchemyManager(RelationalManager):
 
+    serialized_relationships = built_on_first_use('serialized_relationships')
+
     def _init_model(self, resource, model, meta):
         mapper = class_mapper(model)
+        self._schemas = LRUCache(SCHEMA_CACHE_SIZE)
+        self._serializers = LRUCache(SCHEMA_CACHE_SIZE)
 
         self.model = model
         self.id_column = mapper.primary_key[0]
         self.id_attribute = mapper.primary_key[0].name
+        self.sortable_attributes = frozenset(prop.key for prop in mapper.column_attrs)
+        self.nullable_attributes = frozenset(
+            prop.key for prop in mapper.column_attrs
+            if any(getattr(column, 'nullable', True) for column in prop.columns))
+        self.relationships = {prop.key: prop for prop in mapper.relationships}
+
+        self.version_column = mapper.version_id_col
+        if self.version_column is not None:
+            self.version_attribute = mapper.get_property_by_column(self.version_column).key
+
+        self.mapper = mapper
+        self.table = mapper.local_table
+        self.table_columns = {prop.key: prop.columns[0] for prop in mapper.column_attrs
+                              if isinstance(prop.columns[0], Column)
+                              and prop.columns[0].table is self.table}
+        self.row_columns = [column.label(key) for key, column in self.table_columns.items()]
+
+        # an item that is a single table row, with no ORM side effects on
+        # write, can be changed with plain UPDATE and DELETE statements
+        self.load_free_writes = meta.get('load_free_writes', True) and \
+            self.version_column is None and \
+            len(mapper.tables) == 1 and \
+            len(self.table_columns) == len(mapper.column_attrs) and \
+            all(prop.viewonly for prop in mapper.relationships)
 
         self.default_sort_expression = self.id_column.asc()
 
+        # bind key of the replica GET requests read from, False for the primary
+        self.read_bind = meta.get('read_bind', None)
+
         if not hasattr(resource.Meta, 'name'):
             meta['name'] = model.__tablename__.lower()
 
@@ -35,48 +164,436 @@ class SQLAlchemyManager(RelationalManager):
         ns = {"Meta": type('Meta', (object,), {"model": model})}
         self.schema_class = type(meta['name']+'Schema', (Base,), ns)
 
-    @property
-    def schema(self):
-        return self.schema_class(session=self._get_session())
+        # relationships the schema serializes, loaded along with the items
+        schema_fields = self.schema_class().fields
+        self.serialized_relationships = tuple(sorted(
+            key for key in self.relationships
+            if key in schema_fields and not schema_fields[key].load_only))
+
+    def get_schema(self, strict=False, only=None, partial=False):
+        """
+        Returns a schema instance, shared by every request with the same
+        strictness, field set and partial flag.
+        """
+        if only is not None:
+            only = tuple(sorted(only))
+
+        key = (strict, only, partial)
+        schema = self._schemas.get(key)
+
+        if schema is None:
+            schema = self.schema_class(strict=strict,
+                                       only=only,
+                                       partial=partial,
+                                       **self._schema_options())
+            self._schemas.set(key, schema)
+        return schema
+
+    def get_serializer(self, only=None):
+        if only is not None:
+            only = tuple(sorted(only))
+
+        serialize = self._serializers.get(only)
+
+        if serialize is None:
+            schema = self.get_schema(only=only)
+            serialize = _compile_serializer(schema) or \
+                (lambda item: schema.dump(item).data)
+            self._serializers.set(only, serialize)
+        return serialize
+
+    def _schema_options(self):
+        # schemas are shared by every request, loading always writes to the primary
+        return {'session': get_state(current_app).db.session}
+
+    def _get_session(self):
+        bind = self._read_bind()
+        if bind:
+            return _get_read_session(current_app._get_current_object(), bind)
+        return get_state(current_app).db.session
+
+    def _read_bind(self):
+        """
+        Returns the bind key the current request reads from, or None for the
+        primary: only GET and HEAD requests read from a replica, and not
+        after a write or when the client asks to read its own writes.
+        """
+        if not has_request_context() or request.method not in ('GET', 'HEAD'):
+            return None
 
-    def get_schema(self, strict=False):
-        return self.schema_class(session=self._get_session(), strict=strict)
+        bind = self.read_bind
+        if bind is None:
+            bind = current_app.config['TONIC_READ_BIND']
+        if not bind or g.get('tonic_read_primary') or reads_own_writes():
+            return None
+        return bind
 
     @staticmethod
-    def _get_session():
-        return get_state(current_app).db.session
+    def _commit(session):
+        """
+        Commits ``session``, or only flushes it while a batch transaction is
+        open; the batch commits or rolls back every session it collected.
+        """
+        if not has_app_context():
+            session.commit()
+            return
+
+        # later reads of this request must see the write
+        g.tonic_read_primary = True
+        pending = g.get('tonic_transaction')
+
+        if pending is None:
+            session.commit()
+        else:
+            session.flush()
+            if session not in pending:
+                pending.append(session)
+
+    def etag(self, item, fields=None):
+        if self.version_column is None:
+            return super(SQLAlchemyManager, self).etag(item, fields)
+
+        return self._etag(self._etag_source(item), fields)
+
+    def _etag_source(self, item):
+        if self.version_column is None:
+            return None
+        return [getattr(item, self.id_attribute), getattr(item, self.version_attribute)]
+
+    def version_etag(self, id, fields=None):
+        if self.version_column is None:
+            return None
+
+        session = self._get_session()
+        version = session.query(self.version_column).filter(self.id_column == id).scalar()
+
+        if version is None:
+            raise ItemNotFound(self.resource, id=id)
+        return self._etag([id, version], fields)
 
     @staticmethod
     def _is_change(a, b):
         return (a is None) != (b is None) or a != b
 
     def _query(self):
-        return self.model.query
+        return self._get_session().query(self.model)
 
     def _query_filter(self, query, expression):
         return query.filter(expression)
 
+    def _query_count(self):
+        return self._get_session().query(func.count()).select_from(self.model)
+
+    def _query_get_count(self, query):
+        return query.scalar()
+
+    def _filter_columns(self):
+        schema_fields = self.schema_class().fields
+        mapper = class_mapper(self.model)
+
+        for prop in mapper.column_attrs:
+            field = schema_fields.get(prop.key)
+            if field is not None and len(prop.columns) == 1:
+                yield prop.key, getattr(self.model, prop.key), field
+
     def _expression_for_condition(self, condition):
         return condition.filter.expression(condition.value)
 
+    def _expression_for_ids(self, ids):
+        return self.id_column.in_(ids)
+
+    def _or_expression(self, expressions):
+        return or_(*expressions)
+
+    def _and_expression(self, expressions):
+        return and_(*expressions)
+
     def _query_filter_by_id(self, query, id):
         try:
             return query.filter(self.id_column == id).one()
         except NoResultFound:
             raise ItemNotFound(self.resource, id=id)
 
-    def _query_order_by(self, query, sort=None):
-        order_clauses = []
+    def _sort_columns(self, sort=None):
+        """
+        Returns ``(attribute, column, reverse)`` for every sort key, ending
+        with the id column so that the order is total.
+        """
+        columns = []
+
+        for field, attribute, reverse in sort or ():
+            columns.append((attribute, getattr(self.model, attribute), reverse))
+
+        if not any(attribute == self.id_attribute for attribute, _, _ in columns):
+            columns.append((self.id_attribute, self.id_column, False))
 
+        return columns
+
+    def _query_order_by(self, query, sort=None):
         if not sort:
             return query.order_by(self.default_sort_expression)
 
-        for field, attribute, reverse in sort:
-            column = getattr(self.model, attribute)
+        expressions = []
+        for attribute, column, reverse in self._sort_columns(sort):
+            if attribute in self.nullable_attributes:
+                # NULLs last, or first when reversed, whatever the backend does
+                nulls = column.is_(None)
+                expressions.append(nulls.desc() if reverse else nulls.asc())
+            expressions.append(column.desc() if reverse else column.asc())
+
+        return query.order_by(*expressions)
+
+    def _query_load_only(self, query, fields, sort=None):
+        schema_fields = self.schema.fields
+        attributes = set(attribute for attribute, _, _ in self._sort_columns(sort))
+
+        for field in fields:
+            attributes.add(schema_fields[field].attribute or field)
+
+        # relationships are loaded on access as usual
+        columns = [getattr(self.model, attribute) for attribute in attributes
+                   if attribute in self.sortable_attributes]
+        return query.options(load_only(*columns))
+
+    def _query_load_relations(self, query, fields=None, embed=None):
+        """
+        Loads the serialized relationships of every item in a constant
+        number of queries: one ``IN`` query per collection, a join for the
+        rest, and one ``IN`` query per level of embedded relationships.
+        """
+        embed = embed or {}
+        options = []
+
+        for attribute in self.serialized_relationships:
+            if attribute not in embed and (fields is None or attribute in fields):
+                loader = selectinload if self.relationships[attribute].uselist else joinedload
+                options.append(loader(getattr(self.model, attribute)))
+
+        options.extend(self._embed_options(embed))
+        return query.options(*options) if options else query
+
+    def _embed_options(self, embed, parent=None):
+        options = []
+
+        for attribute, nested in sorted(embed.items()):
+            manager = self.relation_resource(attribute).manager
+            relationship = getattr(self.model, attribute)
+            option = selectinload(relationship) if parent is None else \
+                parent.selectinload(relationship)
+            options.append(option)
+
+            # relationships of embedded items are serialized too
+            for related in manager.serialized_relationships:
+                if related not in nested:
+                    options.append(option.selectinload(getattr(manager.model, related)))
+
+            options.extend(manager._embed_options(nested, option))
+
+        return options
+
+    def _expression_for_cursor(self, sort, values):
+        columns = self._sort_columns(sort)
+
+        if len(values) != len(columns):
+            raise InvalidRequest("Invalid cursor")
+
+        values = self._cursor_values(columns, values)
+
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        expressions = []
+        for i, ((attribute, column, reverse), value) in enumerate(zip(columns, values)):
+            after = self._expression_after(attribute, column, reverse, value)
+            if after is None:
+                continue
+
+            clauses = [c.is_(None) if v is None else c == v
+                       for (_, c, _), v in zip(columns[:i], values[:i])]
+            clauses.append(after)
+            expressions.append(and_(*clauses))
+
+        return or_(*expressions)
+
+    def _expression_after(self, attribute, column, reverse, value):
+        """
+        Returns the clause selecting values of ``column`` sorted after
+        ``value``, ``None`` if there are none (see :meth:`_query_order_by`).
+        """
+        if value is None:
+            return column.isnot(None) if reverse else None
+
+        after = column < value if reverse else column > value
+        if not reverse and attribute in self.nullable_attributes:
+            after = or_(after, column.is_(None))
+        return after
+
+    def _cursor_values(self, columns, values):
+        """
+        Deserializes cursor values with the fields of their columns, JSON
+        keeps no dates or decimals.
+        """
+        schema_fields = {field.attribute or name: field
+                         for name, field in self.schema.fields.items()}
+        result = []
+
+        for (attribute, _, _), value in zip(columns, values):
+            field = schema_fields.get(attribute)
+            if value is not None and field is not None:
+                try:
+                    value = field.deserialize(value)
+                except ValidationError:
+                    raise InvalidRequest("Invalid cursor")
+            result.append(value)
+
+        return result
+
+    def _query_get_paginated_items(self, query, page, per_page):
+        items = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+        return Pagination(items[:per_page], page, per_page, len(items) > per_page)
+
+    def _query_get_keyset_items(self, query, cursor, per_page, sort=None):
+        items = self._keyset_query(query, cursor, per_page, sort).all()
+        return self._keyset_pagination(items, per_page, sort)
+
+    def _keyset_query(self, query, cursor, per_page, sort=None):
+        if cursor:
+            query = query.filter(self._expression_for_cursor(sort, decode_cursor(cursor)))
+
+        # one more row tells whether there is a next page
+        return query.limit(per_page + 1)
+
+    def _keyset_pagination(self, items, per_page, sort=None):
+        if len(items) <= per_page:
+            return KeysetPagination(items, per_page)
+
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, attribute)
+                                     for attribute, _, _ in self._sort_columns(sort)])
+        return KeysetPagination(items, per_page, next_cursor)
+
+    def _query_get_stream(self, query):
+        batch_size = current_app.config['TONIC_STREAM_BATCH_SIZE']
+        return query.execution_options(stream_results=True).yield_per(batch_size)
+
+    def export_rows(self, where=None, sort=None, fields=None):
+        """
+        Selects only the exported columns, no model instance is built, and
+        reads them from a server side cursor, ``TONIC_STREAM_BATCH_SIZE``
+        rows at a time.
+        """
+        columns = self._export_columns(fields)
+        query = self._get_session().query(*[getattr(self.model, name) for name, _, _ in columns])
+        query = self._query_order_by(self._query_where(query, where), sort)
+        converters = [convert for _, _, convert in columns]
+
+        rows = (tuple(None if value is None else convert(value)
+                      for convert, value in zip(converters, row))
+                for row in self._query_get_stream(query))
+        return [key for _, key, _ in columns], rows
+
+    def _export_columns(self, fields=None):
+        """Returns ``(attribute, key, converter)`` for every exported column"""
+        schema_fields = self.schema.fields
+
+        if not fields:
+            # in the order of the model, schema fields are unordered
+            fields = [prop.key for prop in self.mapper.column_attrs
+                      if prop.key in schema_fields and not schema_fields[prop.key].load_only]
+
+        columns = []
+        for name in fields:
+            field = schema_fields[name]
+            if name not in self.sortable_attributes:
+                raise InvalidRequest("Only columns can be exported", field=name)
+
+            factory = _field_converters.get(type(field))
+            if factory is None or getattr(field, 'as_string', False):
+                convert = lambda value, field=field, name=name: field._serialize(value, name, None)
+            else:
+                convert = factory(field)
+            columns.append((name, field.dump_to or name, convert))
+
+        return columns
+
+    def parse_sort(self, fields):
+        """
+        Returns sort keys for a list of field names, each one optionally
+        prefixed with ``-`` for descending order.
+        """
+        sort = []
+
+        for field in fields or ():
+            reverse = field.startswith('-')
+            attribute = field.lstrip('-')
+            if attribute not in self.sortable_attributes:
+                raise InvalidRequest("Unknown sort field", field=attribute)
+            sort.append((attribute, attribute, reverse))
+
+        return sort
+
+    def relation_attributes(self):
+        return tuple(sorted(self.relationships))
+
+    def relation_resource(self, attribute):
+        relationship = self.relationships.get(attribute)
+        api = self.resource.api
+
+        if relationship is None or api is None:
+            return None
+
+        for resource in api.resources.values():
+            manager = getattr(resource, 'manager', None)
+            if manager is not None and manager.model is relationship.mapper.class_:
+                return resource
+        return None
+
+    def relation_instances(self, item, attribute, target_resource,
+                           page=None, per_page=None, cursor=None):
+        target = target_resource.manager
+        per_page = self._per_page(per_page)
+
+        query = target.instances()
+        query = target._query_filter(query, with_parent(item, getattr(self.model, attribute)))
+
+        if page is not None:
+            return target._query_get_paginated_items(query, page, per_page)
+        return target._query_get_keyset_items(query, cursor, per_page)
+
+    def relation_add(self, item, attribute, target_resource, target_item):
+        if self.relationships[attribute].uselist:
+            collection = getattr(item, attribute)
+            if target_item not in collection:
+                collection.append(target_item)
+        else:
+            setattr(item, attribute, target_item)
+
+        self._commit_relation(target_resource)
+        return target_item
+
+    def relation_remove(self, item, attribute, target_resource, target_item):
+        if self.relationships[attribute].uselist:
+            collection = getattr(item, attribute)
+            if target_item in collection:
+                collection.remove(target_item)
+        elif getattr(item, attribute) == target_item:
+            setattr(item, attribute, None)
+
+        self._commit_relation(target_resource)
+
+    def _commit_relation(self, target_resource):
+        session = self._get_session()
 
-            order_clauses.append(column.desc() if reverse else column.asc())
+        try:
+            self._commit(session)
+        except IntegrityError as e:
+            session.rollback()
+            self._raise_conflict(e)
 
-        return query.order_by(*order_clauses)
+        self._invalidate()
+        target_resource.manager._invalidate()
+        # relationship lists of items on both sides may have changed
+        self._forget()
+        target_resource.manager._forget()
 
     def create(self, properties, commit=True):
         item = self.model()
@@ -89,39 +606,356 @@ class SQLAlchemyManager(RelationalManager):
         try:
             session.add(item)
             if commit:
-                session.commit()
+                self._commit(session)
         except IntegrityError as e:
             session.rollback()
-            return None
+            self._raise_conflict(e)
 
+        self._invalidate()
         return item
 
+    def create_many(self, items, commit=True):
+        """
+        Validates a list of properties in one pass and inserts the valid
+        ones with bulk inserts, ``TONIC_BULK_CHUNK_SIZE`` rows per commit
+        (all of them in one transaction when unset).
+
+        Returns one result per item, in order; a ``status`` of 201 means the
+        row was inserted.
+        """
+        results, valid = self._validate_many(items)
+        session = self._get_session()
+
+        for chunk in self._chunks(valid):
+            try:
+                # a savepoint keeps earlier chunks (or batch requests) on failure
+                with session.begin_nested():
+                    self._insert_chunk(session, chunk)
+            except IntegrityError:
+                # retry one row at a time to find out which ones conflict
+                for index, row in chunk:
+                    results[index] = self._create_one(session, row)
+            else:
+                for index, _ in chunk:
+                    results[index] = {'status': 201}
+
+            if commit:
+                self._commit(session)
+
+        if valid:
+            self._invalidate()
+        return results
+
+    def _validate_many(self, items):
+        """
+        Returns a list with the result of every invalid item, ``None`` for
+        the others, and a list of ``(index, data)`` for the valid ones.
+        """
+        results = [None] * len(items)
+        indexes = []
+
+        for index, properties in enumerate(items):
+            if isinstance(properties, dict):
+                indexes.append(index)
+            else:
+                results[index] = {'status': 422, 'errors': {'_schema': ['Invalid input type.']}}
+
+        data, errors = self.get_schema().load([items[i] for i in indexes], many=True)
+
+        valid = []
+        for position, index in enumerate(indexes):
+            if errors.get(position):
+                results[index] = {'status': 422, 'errors': errors[position]}
+            else:
+                valid.append((index, data[position]))
+
+        return results, valid
+
+    @staticmethod
+    def _chunks(rows):
+        chunk_size = current_app.config['TONIC_BULK_CHUNK_SIZE'] or len(rows) or 1
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    def _insert_chunk(self, session, chunk):
+        self._insert_rows(session, [row for _, row in chunk])
+
+    def _insert_rows(self, session, rows):
+        """
+        Inserts ``rows`` with a bulk insert, except those setting collections,
+        which need the ORM to write the related rows.
+        """
+        mappings = []
+
+        for row in rows:
+            mapping = self._bulk_mapping(row)
+            if mapping is not None:
+                mappings.append(mapping)
+                continue
+
+            # rows are inserted in order
+            session.bulk_insert_mappings(self.model, mappings)
+            session.add(self.model(**row))
+            session.flush()
+            mappings = []
+
+        session.bulk_insert_mappings(self.model, mappings)
+
+    def _bulk_mapping(self, row):
+        """
+        Returns ``row`` with many-to-one relationships replaced by their
+        foreign key columns, ``None`` if it sets any other relationship.
+        """
+        mapping = {}
+
+        for key, value in row.items():
+            prop = self.relationships.get(key)
+            if prop is None:
+                mapping[key] = value
+                continue
+
+            if prop.direction is not MANYTOONE or prop.secondary is not None:
+                return None
+
+            for local, remote in prop.local_remote_pairs:
+                attribute = self.mapper.get_property_by_column(local).key
+                mapping[attribute] = None if value is None else \
+                    getattr(value, prop.mapper.get_property_by_column(remote).key)
+
+        return mapping
+
+    def _create_one(self, session, row):
+        try:
+            with session.begin_nested():
+                self._insert_rows(session, [row])
+        except IntegrityError as e:
+            result = {'status': 409, 'message': 'Conflict'}
+            if current_app.debug:
+                result['debug_info'] = {'exception_message': str(e.orig)}
+            return result
+        return {'status': 201}
+
     def update(self, item, changes, commit=True):
+        """
+        Writes the values of ``changes`` that differ from ``item``; nothing
+        is flushed when none do.
+
+        With a ``version_id_col`` on the mapper, a version in ``changes``
+        must match the item's, and the ``UPDATE`` only applies to the
+        version that was read, otherwise :class:`VersionConflict` is raised.
+        """
+        actual_changes = self._actual_changes(item, changes)
+
+        if not actual_changes:
+            return item
+
         session = self._get_session()
 
-        actual_changes = {
+        try:
+            for key, value in actual_changes.items():
+                setattr(item, key, value)
+
+            if commit:
+                self._commit(session)
+
+        except StaleDataError:
+            session.rollback()
+            raise VersionConflict(id=getattr(item, self.id_attribute))
+        except IntegrityError as e:
+            session.rollback()
+            self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget(getattr(item, self.id_attribute))
+        return item
+
+    def _actual_changes(self, item, changes):
+        changes = dict(changes)
+
+        if self.version_column is not None:
+            # the version is the one the client read, never a new value
+            version = changes.pop(self.version_attribute, None)
+            if version is not None and version != getattr(item, self.version_attribute):
+                raise VersionConflict(id=getattr(item, self.id_attribute))
+
+        return {
             key: value for key, value in changes.items()
             if self._is_change(get_value(key, item, None), value)
         }
 
+    def _writes_without_loading(self, changes=()):
+        dispatch = self.mapper.dispatch
+        # listeners may be added after the manager is built
+        return self.load_free_writes and \
+            not self.mapper.validators and \
+            not (dispatch.before_update or dispatch.after_update or
+                 dispatch.before_delete or dispatch.after_delete) and \
+            all(key in self.table_columns for key in changes)
+
+    @staticmethod
+    def _supports_returning(dialect):
+        return getattr(dialect, 'full_returning', dialect.implicit_returning)
+
+    def _update_statement(self, id, changes):
+        values = {self.table_columns[key]: value for key, value in changes.items()}
+        # a row already holding every value is left alone, ``onupdate`` included
+        differs = or_(*[column.is_distinct_from(value) for column, value in values.items()])
+        return self.table.update().where(self.id_column == id).where(differs).values(values)
+
+    def _delete_statement(self, id):
+        return self.table.delete().where(self.id_column == id)
+
+    def _select_row(self, id):
+        return select(self.row_columns).where(self.id_column == id)
+
+    def update_by_id(self, id, changes, commit=True):
+        """
+        Updates item ``id`` with a single ``UPDATE ... RETURNING`` when the
+        model allows it (see ``load_free_writes``), otherwise loads it and
+        calls :meth:`update`.
+
+        Returns the updated item, as a :class:`RowItem` on the fast path,
+        where an update changing nothing writes nothing.
+        """
+        if not self._writes_without_loading(changes):
+            return super(SQLAlchemyManager, self).update_by_id(id, changes, commit)
+
+        if not changes:
+            return self.read(id)
+
+        session = self._get_session()
+        statement = self._update_statement(id, changes)
+        returning = self._supports_returning(session.connection(mapper=self.mapper).dialect)
+
         try:
-            for key, value in changes.items():
-                setattr(item, key, value)
+            if returning:
+                row = session.execute(statement.returning(*self.row_columns)).first()
+            elif session.execute(statement).rowcount:
+                row = session.execute(self._select_row(id)).first()
+            else:
+                row = None
+
+            if row is None:
+                # either there is no such item or nothing changed
+                row = session.execute(self._select_row(id)).first()
+                if row is None:
+                    session.rollback()
+                    raise ItemNotFound(self.resource, id=id)
+                return RowItem(zip(self.table_columns, row))
 
             if commit:
-                session.commit()
+                self._commit(session)
 
         except IntegrityError as e:
             session.rollback()
+            self._raise_conflict(e)
 
-            if hasattr(e.orig, 'pgcode'):
-                if e.orig.code == '23505': # duplicate key
-                    raise DuplicateKey(detail=e.orig.diag.message_detail)
+        self._invalidate()
+        self._forget(id)
+        return RowItem(zip(self.table_columns, row))
 
-            if current_app.debug:
-                raise BackendConflict(debug_info=dict(exception_message=str(e),
-                                      statement=e.statement,
-                                      params=e.params))
-            raise BackendConflict()
+    def delete_by_id(self, id, commit=True):
+        """
+        Deletes item ``id`` with a single ``DELETE`` when the model allows it
+        (see ``load_free_writes``), otherwise loads it and calls :meth:`delete`.
+        """
+        if not self._writes_without_loading():
+            return super(SQLAlchemyManager, self).delete_by_id(id, commit)
 
-        return item
+        session = self._get_session()
+
+        try:
+            if not session.execute(self._delete_statement(id)).rowcount:
+                session.rollback()
+                raise ItemNotFound(self.resource, id=id)
+
+            if commit:
+                self._commit(session)
+
+        except IntegrityError as e:
+            session.rollback()
+            self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget(id)
+
+    def delete(self, item, commit=True):
+        session = self._get_session()
+
+        try:
+            id = getattr(item, self.id_attribute)
+            session.delete(item)
+
+            if commit:
+                self._commit(session)
+
+        except IntegrityError as e:
+            session.rollback()
+            self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget(id)
+
+    def update_where(self, changes, where=None, ids=None, commit=True):
+        if not changes:
+            raise InvalidRequest("No changes given")
+
+        for key in changes:
+            if key not in self.sortable_attributes:
+                raise InvalidRequest("Only columns can be updated in bulk", field=key)
+
+        query = self._query_where(self._query(), where, ids)
+        values = self._bulk_changes(changes)
+        return self._execute_bulk(lambda: query.update(values, synchronize_session=False),
+                                  commit)
+
+    def _bulk_changes(self, changes):
+        """
+        Returns ``changes`` with a new version for every row, as the ORM
+        gives one on update; versions the database sets are left to it.
+        """
+        generator = self.mapper.version_id_generator
+        if self.version_column is None or generator is False:
+            return changes
+
+        changes = dict(changes)
+        if isinstance(self.version_column.type, Integer):
+            changes[self.version_attribute] = self.version_column + 1
+        else:
+            changes[self.version_attribute] = generator(None)
+        return changes
+
+    def delete_where(self, where=None, ids=None, commit=True):
+        query = self._query_where(self._query(), where, ids)
+        return self._execute_bulk(lambda: query.delete(synchronize_session=False),
+                                  commit)
+
+    def _execute_bulk(self, statement, commit=True):
+        session = self._get_session()
+
+        try:
+            count = statement()
+
+            if commit:
+                self._commit(session)
+
+        except IntegrityError as e:
+            session.rollback()
+            self._raise_conflict(e)
+
+        self._invalidate()
+        self._forget()
+
+        return count
+
+    @staticmethod
+    def _raise_conflict(e):
+        if hasattr(e.orig, 'pgcode'):
+            if e.orig.code == '23505': # duplicate key
+                raise DuplicateKey(detail=e.orig.diag.message_detail)
+
+        if current_app.debug:
+            raise BackendConflict(debug_info=dict(exception_message=str(e),
+                                  statement=e.statement,
+                                  params=e.params))
+        raise BackendConflict()
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from flask import current_app, request
+
+
 def unpack(value):
     """Return a three tuple of data, code, and headers"""
     if not isinstance(value, tuple):
@@ -24,3 +27,9 @@ def get_value(key, obj, default):
         except (IndexError, TypeError, KeyError):
             pass
     return getattr(obj, key, default)
+
+
+def reads_own_writes():
+    """Whether the client asked to read its own writes in this request"""
+    value = request.headers.get(current_app.config['TONIC_READ_YOUR_WRITES_HEADER'])
+    return value is not None and value.lower() not in ('0', 'false')